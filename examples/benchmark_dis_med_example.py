@@ -0,0 +1,67 @@
+#/usr/bin/env python
+
+"""
+Benchmark of the Median Method dissimilarity selection.
+
+Compare the blockwise np.partition engine of DISC "med" with
+the previous pure python implementation, which sorted the list of
+distances to the selected objects for every candidate at every step.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import random
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist, squareform
+
+from optobj.disc import DISC
+
+
+def median_select(dmx, nobjects, first):
+    """ Previous pure python median dissimilarity selection """
+    dmx = dmx.tolist()
+    disids = [first]
+    while len(disids) < nobjects:
+        dis = [[0, i] for i in range(len(dmx))]
+        for i in range(len(dmx)):
+            if i not in disids:
+                slst = sorted([dmx[i][j] for j in disids])
+                half = len(slst) // 2
+                if len(slst) % 2 != 0:
+                    dis[i][0] = slst[half]
+                else:
+                    dis[i][0] = (slst[half] + slst[half-1])/2.0
+        dis = sorted(dis, key=lambda item: item[0])
+        disids.append(dis[-1][-1])
+    return disids
+
+
+for N, K in [(500, 50), (1000, 100), (2000, 200)]:
+    np.random.seed(N)
+    mx = np.random.rand(N, 2)
+    dmx = squareform(pdist(mx, 'euclidean'))
+
+    random.seed(N)
+    t = time.time()
+    idsel = DISC(dmx, "med", K).select()
+    tnew = time.time()-t
+
+    t = time.time()
+    refsel = median_select(dmx, K, idsel[0])
+    tref = time.time()-t
+
+    print("N: %d K: %d python: %.3f s partition: %.3f s speedup: %.1fx %s" %
+          (N, K, tref, tnew, tref/tnew,
+           "same selection" if refsel == idsel else "DIFFERENT selection"))
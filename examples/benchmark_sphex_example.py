@@ -0,0 +1,100 @@
+#/usr/bin/env python
+
+"""
+Benchmark of the Sphere Exclusion selection against the
+Min dissimilarity (MaxMin) selection.
+
+The exclusion radius is the MaxMin distance reached by DISC after K
+picks, so both selections cover the dataset within the same radius.
+DISC reads a full row of distances at every step. For Sphere
+Exclusion the points of every k-d tree leaf reached by a radius query
+are counted, an upper bound of the distances the query computes, so
+the reduction reported is a lower bound.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from optobj.disc import DISC
+from optobj.distance import FeatureDistance
+from optobj.profiling import StepRecorder
+from optobj.sphex import SphereExclusion
+
+
+def evaluations(tree, point, radius):
+    """Distances a k-d tree radius query may compute
+
+    The points of every leaf whose cell lies within radius of point,
+    an upper bound of the distances computed by query_ball_point,
+    which skips the leaves entirely inside the ball.
+    """
+    count = 0
+    stack = [(tree.tree, tree.mins.copy(), tree.maxes.copy())]
+    while stack:
+        node, low, high = stack.pop()
+        gap = np.maximum(0, np.maximum(low - point, point - high))
+        if np.sqrt((gap*gap).sum()) > radius:
+            continue
+        if node.split_dim == -1:
+            count += node.children
+            continue
+        dim = node.split_dim
+        lhigh = high.copy()
+        lhigh[dim] = node.split
+        glow = low.copy()
+        glow[dim] = node.split
+        stack.append((node.lesser, low, lhigh))
+        stack.append((node.greater, glow, high))
+    return count
+
+
+def coverage(x, ids):
+    """ Largest distance of an object from its nearest selected one """
+    mind = np.full(len(x), np.inf)
+    for start in range(0, len(ids), 256):
+        block = cdist(x[ids[start:start+256]], x)
+        np.minimum(mind, block.min(axis=0), out=mind)
+    return mind.max()
+
+
+for N, K in [(10000, 100), (50000, 300), (200000, 1000)]:
+    np.random.seed(N)
+    mx = np.random.rand(N, 3)
+
+    drec = StepRecorder()
+    t = time.time()
+    dsel = DISC(FeatureDistance(mx), "min", K, observer=drec,
+                random_state=N)
+    dids = dsel.select()
+    tdisc = time.time()-t
+    # the MaxMin distance of the next pick
+    radius = dsel.dis_[~dsel.selected_].max()
+
+    t = time.time()
+    ssel = SphereExclusion(mx, radius)
+    sids = ssel.select()
+    tsph = time.time()-t
+    sdist = sum(evaluations(ssel.tree_, mx[i], radius) for i in sids)
+
+    print("N: %7d radius: %.4f" % (N, radius))
+    print("  DISC Min         selected: %5d distances: %11d time: %.3f s "
+          "coverage: %.4f" % (len(dids), drec.lookups(), tdisc,
+                              coverage(mx, dids)))
+    print("  SphereExclusion  selected: %5d distances: %11d time: %.3f s "
+          "coverage: %.4f" % (len(sids), sdist, tsph, coverage(mx, sids)))
+    print("  distance reduction: at least %.1fx" %
+          (drec.lookups()/float(max(sdist, 1))))
@@ -0,0 +1,51 @@
+#/usr/bin/env python
+
+"""
+Example of a Dissimilarity selection saved to disk while running,
+interrupted and resumed from the last snapshot.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import tempfile
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.checkpoint import Checkpointer, load
+from optobj.disc import DISC
+
+
+N = 2000
+np.random.seed(N)
+mx = np.random.rand(N, 2)
+dmx = pdist(mx, "euclidean")
+
+fname = os.path.join(tempfile.mkdtemp(), "disc.npz")
+
+# uninterrupted run
+ref = DISC(dmx, "min", 200, random_state=N).select()
+
+# snapshot every 50 objects, then stop after 120 as on a preemption
+csel = DISC(dmx, "min", 200, observer=Checkpointer(fname, every=50),
+            random_state=N)
+for objid in csel.iter_select():
+    if len(csel.dislist()) == 120:
+        break
+
+# the run restarts from the snapshot of the 100th object
+csel = load(fname, dmx, observer=Checkpointer(fname, every=50))
+print("Resumed at %d objects" % (len(csel.dislist())))
+idsel = csel.select()
+print("Same selection as the uninterrupted run: %s" % (idsel == ref))
+os.remove(fname)
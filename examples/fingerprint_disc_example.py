@@ -0,0 +1,45 @@
+#/usr/bin/env python
+
+"""
+Example of Dissimilarity selection on packed binary fingerprints,
+with the Tanimoto distances computed on request.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+
+from optobj.disc import DISC
+from optobj.fingerprint import FingerprintDistance, onbits_fingerprints
+
+
+N = 100000
+NBITS = 2048
+np.random.seed(N)
+# random fingerprints with 40 to 120 bits set, as lists of set bits
+onbits = [np.random.choice(NBITS, np.random.randint(40, 120), replace=False)
+          for i in range(N)]
+fps = onbits_fingerprints(onbits, NBITS)
+dmx = FingerprintDistance(fps)
+print("Packed fingerprints: %.1f MB, dense float64 distance matrix: "
+      "%.1f GB" % (dmx.nbytes/1e6, 8.0*N*N/1e9))
+
+t = time.time()
+csel = DISC(dmx, "min", 100, random_state=N)
+idsel = csel.select()
+print("Time: %.3f" % (time.time()-t))
+# every object is within this Tanimoto distance from a selected one
+print("Selected %d objects in %d, coverage radius: %.3f" %
+      (len(idsel), N, csel.dis_[~csel.selected_].max()))
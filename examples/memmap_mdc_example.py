@@ -0,0 +1,99 @@
+#/usr/bin/env python
+
+"""
+Example of Most Descriptive compound selection on a distance matrix
+stored on disk and read through a memory map.
+
+The selection runs in a child process whose heap (RLIMIT_DATA) is
+capped below the size of the matrix. The read only file mapping is not
+charged to that limit, so the run fails if the selection copies the
+matrix into memory.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import multiprocessing
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from optobj.distance import memmap_distance, write_distance
+from optobj.mdc import MDC
+
+
+N = 12000
+# heap allowed to the selection on top of the one of the child at start
+MARGIN = 200*1024**2
+
+
+def _vmdata():
+    """ Heap and private mappings of the process in bytes (Linux) """
+    with open("/proc/self/status") as fin:
+        for line in fin:
+            if line.startswith("VmData:"):
+                return int(line.split()[1])*1024
+    return None
+
+
+def select(fname, queue):
+    """ Run the selection with the heap capped """
+    used = _vmdata()
+    limit = used + MARGIN
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    t = time.time()
+    dmx = memmap_distance(fname, N, dtype="float32", layout="square")
+    idsel = MDC(dmx, 50).select()
+    queue.put((len(idsel), time.time()-t, limit, used))
+
+
+def main():
+    np.random.seed(N)
+    mx = np.random.rand(N, 2)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, "dmx.bin")
+        # the matrix is computed and written by blocks of rows; the
+        # square layout is read in one forward pass by the selection
+        write_distance(fname, mx, "euclidean", dtype="float32",
+                       layout="square")
+        size = os.path.getsize(fname)
+        print("Distance matrix size: %.1f MB" % (size/1024.0**2))
+
+        if not os.path.exists("/proc/self/status"):
+            print("No /proc/self/status, the memory cap is Linux only")
+            return
+        print("Starting Selection")
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=select, args=(fname, queue))
+        proc.start()
+        proc.join()
+        assert proc.exitcode == 0, "the selection exceeded the memory cap"
+        nsel, seconds, limit, used = queue.get()
+        print("Time: %.3f" % (seconds))
+        print("Selected %d objects in %d" % (nsel, N))
+        print("Heap cap: %.1f MB, %.1f MB over the %.1f MB at start, "
+              "against a %.1f MB matrix" % (limit/1024.0**2,
+                                            MARGIN/1024.0**2,
+                                            used/1024.0**2,
+                                            size/1024.0**2))
+        assert MARGIN < size
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
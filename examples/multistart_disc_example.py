@@ -0,0 +1,54 @@
+#/usr/bin/env python
+
+"""
+Example of a multi-start DISC: the selection is repeated from several
+random first picks on worker processes and the most diverse subset
+is kept.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.multistart import MultiStartDISC
+
+
+def main():
+    N = 3000
+    np.random.seed(N)
+    dmx = pdist(np.random.rand(N, 2), "euclidean")
+
+    for method in ("max", "sum"):
+        t = time.time()
+        single = MultiStartDISC(dmx, method, 50, nstarts=1, objective="mean",
+                                random_state=0)
+        single.select()
+        tsingle = time.time()-t
+        t = time.time()
+        multi = MultiStartDISC(dmx, method, 50, nstarts=8, objective="mean",
+                               random_state=0)
+        multi.select()
+        tmulti = time.time()-t
+        print("%s 1 start: %.4f in %.2f s  8 starts: best %.4f "
+              "(worst %.4f) in %.2f s" %
+              (method, single.scores_[0], tsingle,
+               multi.scores_.max(), multi.scores_.min(), tmulti))
+        print("   scores per start: %s" %
+              " ".join("%.4f" % score for score in multi.scores_))
+
+
+if __name__ == "__main__":
+    main()
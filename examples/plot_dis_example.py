@@ -18,7 +18,7 @@ del path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import pdist
 
 from optobj.disc import DISC
 import time
@@ -27,12 +27,13 @@ N = 2000
 np.random.seed(N)
 mx = np.random.rand(N, 2)
 
-dmx = squareform(pdist(mx, 'euclidean'))
+# condensed distance matrix, no need of squareform
+dmx = pdist(mx, 'euclidean')
 
 t = time.time()
 csel = DISC(dmx, "min", int(0.20*N))
 idsel = csel.select()
-print "Time: %.3f" % (time.time()-t)
+print("Time: %.3f" % (time.time()-t))
 
 #print(idsel)
 print("Selected %d objects in %d" % (len(idsel), float(N)))
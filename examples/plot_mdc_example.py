@@ -18,7 +18,7 @@ del path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import pdist
 
 import time
 from optobj.mdc import MDC
@@ -28,13 +28,14 @@ N = 1000 # slow with 5000
 np.random.seed(N)
 mx = np.random.rand(N, 2)
 
-dmx = squareform(pdist(mx, 'euclidean'))
+# condensed distance matrix, no need of squareform
+dmx = pdist(mx, 'euclidean')
 
 print("Starting Selection")
 t = time.time()
 csel = MDC(dmx)
 idsel = csel.select()
-print "Time: %.3f" % (time.time()-t)
+print("Time: %.3f" % (time.time()-t))
 
 print("Selected %d objects in %d" % (len(idsel), float(N)))
 
@@ -0,0 +1,64 @@
+#/usr/bin/env python
+
+"""
+Example of the approximate Most Descriptive Compound selection,
+with the information vector estimated from a sample of rows.
+
+The distances are computed on request from the features, so the
+row*row matrix is never stored.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.distance import FeatureDistance
+from optobj.mdc import MDC
+
+
+# exact and approximate selection on a small dataset
+N = 3000
+np.random.seed(N)
+mx = np.random.rand(N, 2)
+
+t = time.time()
+exact = MDC(pdist(mx, "euclidean"), 50)
+texact = time.time()-t
+exids = exact.select()
+
+t = time.time()
+approx = MDC(FeatureDistance(mx), 50, sample=0.05, random_state=N)
+tapprox = time.time()-t
+apids = approx.select()
+
+# percentile of the picks in the exact information vector
+pct = 100.0*MDC(pdist(mx, "euclidean")).info_.argsort().argsort()/N
+print("N: %d build exact: %.2f s approximate: %.2f s" % (N, texact, tapprox))
+print("Exact information percentile of the picks: exact %.1f "
+      "approximate %.1f" % (pct[exids].mean(), pct[apids].mean()))
+print("Common picks: %d of %d" % (len(set(exids) & set(apids)), len(exids)))
+
+# approximate selection where the distance matrix would take 80 GB
+N = 100000
+np.random.seed(N)
+mx = np.random.rand(N, 2)
+t = time.time()
+csel = MDC(FeatureDistance(mx), 50, sample=200, random_state=N)
+print("N: %d build: %.2f s" % (N, time.time()-t))
+print("Mean relative standard error of the estimates: %.3f" %
+      (csel.infoerr_.mean()/csel.info_.mean()))
+idsel = csel.select()
+print("Time: %.2f s" % (time.time()-t))
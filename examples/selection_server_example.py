@@ -0,0 +1,120 @@
+#/usr/bin/env python
+
+"""
+Example of a local selection server: the distance matrices are loaded
+once into shared memory and many clients run MDC, KS and DISC jobs
+on them concurrently. The selections are checked against the ones of
+the selectors run in this process.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.disc import DISC
+from optobj.ks import KS
+from optobj.mdc import MDC
+from optobj.server import Client
+
+
+def dataset(n, seed):
+    rng = np.random.RandomState(seed)
+    return pdist(rng.rand(n, 2), "euclidean")
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    address = os.path.join(tmpdir, "optobj.sock")
+    dmx = {"a": dataset(1500, 1), "b": dataset(1200, 2),
+           "c": dataset(1000, 3)}
+    # room for two of the three datasets
+    maxmemory = (dmx["a"].nbytes + dmx["b"].nbytes) / 1024.0**2
+    server = subprocess.Popen([sys.executable, "-m", "optobj.server",
+                               "--socket", address,
+                               "--maxmemory", str(maxmemory),
+                               "--n-jobs", "2"],
+                              cwd=sys.path[1])
+    try:
+        with Client(address, wait=10.0) as client:
+            client.put("a", dmx["a"])
+            np.save(os.path.join(tmpdir, "b.npy"), dmx["b"])
+            client.load("b", os.path.join(tmpdir, "b.npy"))
+            print("resident: %s" % [d["name"] for d in client.datasets()])
+
+            for k in (10, 20, 40):
+                t = time.time()
+                client.select("a", "mdc", k)
+                print("mdc k: %d %.3f s" % (k, time.time()-t))
+
+        jobs = [("a", "mdc", 30, None), ("a", "ks", 30, None),
+                ("b", "max", 30, 7), ("b", "min", 30, 7),
+                ("a", "mdc", 15, None), ("b", "mdc", 25, None)]
+
+        def run(job):
+            # one connection per thread, the jobs run concurrently
+            with Client(address) as client:
+                return client.select(*job)
+
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            results = list(pool.map(run, jobs))
+
+        for (name, method, k, seed), ids in zip(jobs, results):
+            if method == "mdc":
+                ref = MDC(dmx[name], k).select()
+            elif method == "ks":
+                ref = KS(dmx[name], k, "precomputed").select()
+            else:
+                ref = DISC(dmx[name], method, k,
+                           random_state=seed).select()
+            assert list(ref) == ids, (name, method, k)
+            print("%s %-4s k: %d same as local" % (name, method, k))
+
+        with Client(address) as client:
+            # the least recently used dataset (b) leaves room for c
+            client.select("a", "mdc", 5)
+            client.put("c", dmx["c"])
+            resident = [d["name"] for d in client.datasets()]
+            assert resident == ["a", "c"], resident
+            print("resident: %s" % resident)
+            try:
+                client.select("b", "mdc", 5)
+                raise AssertionError("b was not evicted")
+            except RuntimeError as err:
+                print("evicted: %s" % err)
+
+            # a rejected put leaves the connection usable
+            try:
+                client.put("huge", dataset(2500, 4))
+                raise AssertionError("put over maxmemory accepted")
+            except RuntimeError as err:
+                print("rejected: %s" % err)
+            stats = client.stats()
+            assert stats["evictions"] == 1, stats
+            print("stats: %s" % stats)
+            client.shutdown()
+        assert server.wait(10) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#/usr/bin/env python
+
+"""
+Example of many selections of different size and seed served
+by one Session on the same dataset.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.session import Session
+
+
+N = 2000
+np.random.seed(N)
+mx = np.random.rand(N, 2)
+dmx = pdist(mx, "euclidean")
+
+session = Session(dmx, x=mx)
+t = time.time()
+# the information vector is built by the first request only and
+# the smaller selections are prefixes of the largest one
+for k in [1000, 500, 100, 50]:
+    print("MDC k: %4d first ids: %s" % (k, session.mdc(k)[:5]))
+for seed in range(3):
+    for k in [50, 100]:
+        print("DISC Min seed: %d k: %4d first ids: %s" %
+              (seed, k, session.disc("min", k, seed)[:5]))
+print("KS k: 100 first ids: %s" % (session.ks(100)[:5]))
+print("Time: %.3f" % (time.time()-t))
+print("Requests served from a running selection: %d" % (session.hits_))
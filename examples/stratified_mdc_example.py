@@ -0,0 +1,59 @@
+#/usr/bin/env python
+
+"""
+Example of a stratified MDC selection: every vendor gets a quota in
+proportion to its size, the vendors are selected in parallel on their
+own distance submatrix and a global pass spreads the merged picks.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.mdc import MDC
+from optobj.multistart import diversity
+from optobj.stratified import StratifiedSelection
+
+
+def main():
+    N = 4000
+    np.random.seed(N)
+    mx = np.random.rand(N, 2)
+    vendors = np.random.choice(["acme", "bio", "chem", "dyn"], N,
+                               p=[0.4, 0.3, 0.2, 0.1])
+    dmx = pdist(mx, "euclidean")
+
+    t = time.time()
+    ids = MDC(dmx, 100).select()
+    print("MDC on all the objects: %.2f s min distance: %.4f" %
+          (time.time()-t, diversity(dmx, ids)))
+    print("   picks per vendor: %s" %
+          dict((str(v), int((vendors[ids] == v).sum()))
+               for v in np.unique(vendors)))
+
+    for refine in (0, 100):
+        t = time.time()
+        sel = StratifiedSelection(dmx, vendors, 100, "mdc", refine=refine)
+        ids = sel.select()
+        print("stratified MDC refine: %3d %.2f s min distance: %.4f "
+              "exchanges: %d" % (refine, time.time()-t,
+                                 diversity(dmx, ids), sel.nswaps_))
+        print("   picks per vendor: %s" %
+              dict((v, len(sel.selections_[v])) for v in sel.selections_))
+
+
+if __name__ == "__main__":
+    main()
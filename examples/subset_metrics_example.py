@@ -0,0 +1,59 @@
+#/usr/bin/env python
+
+"""
+Example of the subset quality curves recorded during MDC, KS and DISC
+selections, used to choose the number of objects where the coverage
+radius stops improving.
+
+
+Code Source: Giuseppe Marco Randazzo
+License: BSD 3 clausole
+
+"""
+import os
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if not path in sys.path:
+    sys.path.insert(1, path)
+del path
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj.disc import DISC
+from optobj.ks import KS
+from optobj.mdc import MDC
+from optobj.metrics import SubsetMetrics
+
+
+def main():
+    N = 2000
+    np.random.seed(N)
+    # 12 gaussian clusters
+    centers = np.random.rand(12, 2)*10
+    mx = centers[np.random.randint(0, 12, N)] + np.random.randn(N, 2)*0.3
+    dmx = pdist(mx, "euclidean")
+
+    for name, make in (("mdc", lambda obs: MDC(dmx, 150, observer=obs)),
+                       ("ks", lambda obs: KS(mx, 150, observer=obs)),
+                       ("disc", lambda obs: DISC(dmx, "min", 150,
+                                                 observer=obs,
+                                                 random_state=0))):
+        metrics = SubsetMetrics(dmx)
+        make(metrics).select()
+        coverage = metrics.curve("coverage")
+        mindist = metrics.curve("mindist")
+        meandist = metrics.curve("meandist")
+        print("%s" % (name))
+        for k in (2, 5, 10, 20, 50, 100, 150):
+            print("  k: %3d coverage: %6.3f mindist: %6.3f meandist: %6.3f" %
+                  (k, coverage[k-1], mindist[k-1], meandist[k-1]))
+        print("  coverage plateau (1%%) at k: %d" % (metrics.plateau()))
+        sizes = np.bincount(metrics.nearest_, minlength=N)[metrics.ids_]
+        print("  objects represented per selected object: "
+              "min %d max %d" % (sizes.min(), sizes.max()))
+
+
+if __name__ == "__main__":
+    main()
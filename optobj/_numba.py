@@ -0,0 +1,44 @@
+"""
+numba kernels of optobj.backend.NumbaBackend
+
+The kernels are compiled on the first call and cached on disk
+next to this module (or in NUMBA_CACHE_DIR).
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from numba import njit
+
+
+@njit(cache=True)
+def aggregate(dis, row, code):
+    """ dis = min (code 0), max (code 1) or sum (code 2) of dis and row """
+    for i in range(dis.shape[0]):
+        if code == 0:
+            if row[i] < dis[i]:
+                dis[i] = row[i]
+        elif code == 1:
+            if row[i] > dis[i]:
+                dis[i] = row[i]
+        else:
+            dis[i] += row[i]
+
+
+@njit(cache=True)
+def masked_argmax(score, mask, last):
+    """ First (or last) id of the largest score where mask is False """
+    best = -1
+    value = -1.0
+    for i in range(score.shape[0]):
+        current = -float("inf") if mask[i] else score[i]
+        if best < 0 or current > value or (last and current == value):
+            best = i
+            value = current
+    return best
+
+
+@njit(cache=True)
+def scatter_add(out, ids, weights):
+    """ out[ids] += weights, in the order of ids """
+    for k in range(ids.shape[0]):
+        out[ids[k]] += weights[k]
@@ -0,0 +1,191 @@
+"""
+Compute backends of the per-step score updates
+
+The selectors call the kernels of the active backend:
+
+    aggregate(dis, row, method)
+        Update dis in place with the minimum, maximum or sum of dis
+        and row.
+
+    masked_argmax(score, mask, last=False)
+        Id of the largest score among the objects where mask is False,
+        the first one in case of ties or the last one with last=True.
+
+    scatter_add(out, ids, weights)
+        out[ids] += weights, accumulating repeated ids in order.
+
+numpy is the reference backend. numba compiles the same kernels with
+a disk cache, so the compilation is paid once per machine; it is
+available when numba is installed. The backend is chosen with
+set_backend or with the OPTOBJ_BACKEND environment variable.
+
+Run python -m optobj.backend to check the parity of the available
+backends with the reference one.
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import os
+import sys
+
+from numpy import add, asarray, float64, inf, maximum, minimum
+from numpy import random as nprandom
+
+
+class NumpyBackend(object):
+    """ Reference kernels written with numpy ufuncs """
+
+    name = "numpy"
+
+    def aggregate(self, dis, row, method):
+        """ Update dis with the min, max or sum of dis and row """
+        if method == "min":
+            minimum(dis, row, out=dis)
+        elif method == "max":
+            maximum(dis, row, out=dis)
+        else:
+            dis += row
+
+    def masked_argmax(self, score, mask, last=False):
+        """ Id of the largest score where mask is False """
+        score = asarray(score).astype(float64)
+        score[mask] = -inf
+        if last:
+            return len(score) - 1 - int(score[::-1].argmax())
+        return int(score.argmax())
+
+    def scatter_add(self, out, ids, weights):
+        """ out[ids] += weights with repeated ids """
+        add.at(out, ids, weights)
+
+
+class NumbaBackend(object):
+    """Kernels compiled by numba
+
+    Every kernel is a single loop over the objects, without the
+    temporary arrays of the numpy expressions.
+    """
+
+    name = "numba"
+
+    def __init__(self):
+        # raises ImportError without numba
+        from optobj import _numba
+        self._kernels = _numba
+
+    def aggregate(self, dis, row, method):
+        """ Update dis with the min, max or sum of dis and row """
+        code = {"min": 0, "max": 1}.get(method, 2)
+        self._kernels.aggregate(dis, row.astype(dis.dtype, copy=False),
+                                code)
+
+    def masked_argmax(self, score, mask, last=False):
+        """ Id of the largest score where mask is False """
+        return int(self._kernels.masked_argmax(score, mask, last))
+
+    def scatter_add(self, out, ids, weights):
+        """ out[ids] += weights with repeated ids """
+        self._kernels.scatter_add(out, ids.ravel(), weights.ravel())
+
+
+# name -> backend class
+BACKENDS = {"numpy": NumpyBackend, "numba": NumbaBackend}
+
+# The backend in use, see set_backend
+_ACTIVE = None
+
+
+def register(name, backend):
+    """ Register a backend class under name """
+    BACKENDS[name] = backend
+
+
+def available():
+    """ Names of the backends whose dependencies are installed """
+    names = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_backend(name):
+    """Activate a backend
+
+    Raises ValueError for an unknown name and ImportError when the
+    dependencies of the backend are missing.
+    """
+    global _ACTIVE
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend %s" % (name))
+    _ACTIVE = BACKENDS[name]()
+    return _ACTIVE
+
+
+def get_backend():
+    """ The active backend, OPTOBJ_BACKEND or numpy by default """
+    if _ACTIVE is None:
+        return set_backend(os.environ.get("OPTOBJ_BACKEND", "numpy"))
+    return _ACTIVE
+
+
+def parity(name, size=10000, seed=0):
+    """Compare the kernels of a backend with the numpy ones
+
+    Returns
+    ------
+    errors : dict
+        Largest absolute difference of every float kernel, and 0 or 1
+        for the argmax kernels, on random data with ties.
+    """
+    ref = NumpyBackend()
+    other = BACKENDS[name]()
+    rng = nprandom.default_rng(seed)
+    errors = {}
+    for method in ("min", "max", "sum"):
+        dis = rng.random(size)
+        row = rng.random(size)
+        expected = dis.copy()
+        ref.aggregate(expected, row, method)
+        other.aggregate(dis, row, method)
+        errors["aggregate-" + method] = float(abs(dis - expected).max())
+    # rounded scores so that the maximum is tied
+    score = rng.integers(0, 50, size).astype(float)
+    mask = rng.random(size) < 0.3
+    for last in (False, True):
+        errors["masked_argmax-" + ("last" if last else "first")] = int(
+            ref.masked_argmax(score, mask, last) !=
+            other.masked_argmax(score, mask, last))
+    errors["scatter_add"] = _parity_scatter(ref, other, rng, size)
+    return errors
+
+
+def _parity_scatter(ref, other, rng, size):
+    """ Largest difference of scatter_add with repeated ids """
+    ids = rng.integers(0, size // 10, size)
+    weights = rng.random(size)
+    expected = rng.random(size // 10)
+    out = expected.copy()
+    ref.scatter_add(expected, ids, weights)
+    other.scatter_add(out, ids, weights)
+    return float(abs(out - expected).max())
+
+
+def main():
+    """ Print the parity of the available backends """
+    failed = 0
+    for name in available():
+        errors = parity(name)
+        ok = max(errors.values()) == 0
+        failed += not ok
+        print("%-8s %s %s" % (name, "ok" if ok else "MISMATCH",
+                              " ".join("%s: %g" % item
+                                       for item in sorted(errors.items()))))
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Benchmark of the object selection algorithms
+
+Run from the command line, for example:
+
+    python -m optobj.benchmark -n 500 1000 -k 10 50 -o results.json
+    python -m optobj.benchmark -n 500 1000 -k 10 50 --compare results.json
+    python -m optobj.benchmark -n 2000 -k 100 -b numpy numba
+
+Every case runs in a fresh process so that the peak memory is measured
+for that case only. Results are written as JSON and can be compared
+with a previous run to guard the hot loops against regressions.
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue as queues
+import random
+import resource
+import sys
+import time
+from itertools import product
+
+import numpy as np
+
+from optobj.backend import available, parity, set_backend
+from optobj.disc import DISC
+from optobj.ks import KS
+from optobj.mdc import MDC
+from optobj.profiling import StepRecorder
+
+SELECTORS = ["mdc", "ks", "disc-min", "disc-max", "disc-med", "disc-sum"]
+
+
+def dataset(nobjects, ndim=2, dtype="float64"):
+    """Synthetic dataset seeded as in examples/plot_mdc_example.py
+
+    Returns
+    ------
+    mx : array, shape(nobjects, ndim)
+        Uniform random features.
+
+    dmx : array, shape(nobjects*(nobjects-1)/2,)
+        Condensed euclidean distance matrix.
+    """
+    from scipy.spatial.distance import pdist
+    np.random.seed(nobjects)
+    mx = np.random.rand(nobjects, ndim)
+    return mx.astype(dtype), pdist(mx, "euclidean").astype(dtype)
+
+
+def _peak_rss():
+    """ Peak resident memory of the process in MB """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024.0**2 if sys.platform == "darwin" else 1024.0)
+
+
+def _make(selector, mx, dmx, nobjects, observer):
+    """ Build the selector of a case """
+    if selector == "mdc":
+        return MDC(dmx, nobjects, observer=observer)
+    if selector == "ks":
+        return KS(mx, nobjects, observer=observer)
+    return DISC(dmx, selector.split("-")[1], nobjects, observer=observer)
+
+
+def run_case(selector, nobjects, nselect, dtype="float64", ndim=2,
+             phases=False, backend="numpy"):
+    """Time one selection case in the current process
+
+    The kernels of the backend are run once before the timing, so
+    that the numba compilation (or cache load) is not measured.
+
+    Returns
+    ------
+    result : dict
+        setup time (selector construction, including the MDC
+        information vector), select time and time per selected
+        object in seconds, and peak RSS in MB. With phases, also the
+        total time of every step phase and the distance lookups.
+    """
+    set_backend(backend)
+    parity(backend, size=100)
+    data = dataset(nobjects, ndim, dtype)
+    random.seed(nobjects)
+    recorder = StepRecorder() if phases else None
+    t = time.time()
+    sel = _make(selector, data[0], data[1], nselect, recorder)
+    tsetup = time.time()-t
+    t = time.time()
+    ids = sel.select()
+    tselect = time.time()-t
+    result = {"selector": selector,
+              "n": nobjects,
+              "k": nselect,
+              "dtype": dtype,
+              "ndim": ndim,
+              "backend": backend,
+              "selected": len(ids),
+              "setup": tsetup,
+              "select": tselect,
+              "step": tselect/max(len(ids), 1),
+              "peak_rss_mb": _peak_rss()}
+    if recorder is not None:
+        result["phases"] = recorder.totals()
+        result["lookups"] = recorder.lookups()
+    return result
+
+
+def _run_child(queue, args):
+    """ Run a case and send back the result """
+    queue.put(run_case(*args))
+
+
+def run(selectors, sizes, nselects, dtypes=("float64",), ndim=2, repeat=1,
+        phases=False, verbose=True, backends=("numpy",), timeout=None):
+    """Run the benchmark sweep
+
+    Parameters
+    ----------
+    selectors : list
+        Cases among mdc, ks, disc-min, disc-max, disc-med, disc-sum.
+
+    sizes : list
+        Number of objects of the datasets.
+
+    nselects : list
+        Number of objects to select. Values larger than the dataset
+        are skipped.
+
+    dtypes : list, optional, default: float64
+        Data types of the distances and features.
+
+    ndim : int, optional, default: 2
+        Number of features of the datasets.
+
+    repeat : int, optional, default: 1
+        Repetitions of every case. The fastest one is kept.
+
+    phases : bool, optional, default: False
+        Record the time of the step phases with a StepRecorder.
+
+    backends : list, optional, default: numpy
+        Compute backends, see optobj.backend. The ones whose
+        dependencies are missing are skipped.
+
+    timeout : float, optional, default: None
+        Seconds after which a run is killed. None waits for every run.
+
+    Returns
+    ------
+    results : list
+        One dictionary per case, see run_case. A case whose process
+        raised, was killed (e.g. out of memory) or timed out has the
+        case keys and a failed entry with the reason instead of the
+        timings.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    backends = _usable(backends, verbose)
+    results = []
+    # case is (selector, nobjects, nselect, dtype)
+    for case in product(selectors, sizes, nselects, dtypes):
+        if case[2] > case[1]:
+            continue
+        for backend in backends:
+            best = _best(ctx, repeat, case + (ndim, phases, backend),
+                         timeout)
+            results.append(best)
+            if verbose:
+                _report(best, phases)
+    return results
+
+
+def _usable(backends, verbose):
+    """ The backends whose dependencies are installed """
+    usable = available()
+    for backend in backends:
+        if backend not in usable and verbose:
+            print("backend %s not available, skipped" % (backend))
+    return [backend for backend in backends if backend in usable]
+
+
+def _best(ctx, repeat, args, timeout=None):
+    """ Fastest of repeat runs of a case, each in a fresh process """
+    runs = []
+    for _ in range(max(repeat, 1)):
+        res = _run_process(ctx, args, timeout)
+        if "failed" in res:
+            return res
+        runs.append(res)
+    return min(runs, key=lambda res: res["select"])
+
+
+def _run_process(ctx, args, timeout=None):
+    """ Run a case in a fresh process, a failed result if it dies """
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_child, args=(queue, args))
+    proc.start()
+    start = time.time()
+    res = None
+    while res is None:
+        try:
+            res = queue.get(timeout=1.0)
+        except queues.Empty:
+            if not proc.is_alive():
+                # the result may have been queued right before the exit
+                try:
+                    res = queue.get(timeout=1.0)
+                except queues.Empty:
+                    res = {"failed": "exit code %s" % (proc.exitcode)}
+            elif timeout is not None and time.time() - start > timeout:
+                proc.kill()
+                res = {"failed": "timeout after %g s" % (timeout)}
+    proc.join()
+    if "failed" in res:
+        selector, nobjects, nselect, dtype, ndim, _, backend = args
+        res.update({"selector": selector, "n": nobjects, "k": nselect,
+                    "dtype": dtype, "ndim": ndim, "backend": backend})
+    return res
+
+
+def _report(res, phases):
+    """ Print the result of a case """
+    if "failed" in res:
+        print("%-9s n: %7d k: %6d %-7s %-5s FAILED: %s" %
+              (res["selector"], res["n"], res["k"], res["dtype"],
+               res["backend"], res["failed"]))
+        return
+    print("%-9s n: %7d k: %6d %-7s %-5s setup: %8.3f s "
+          "select: %8.3f s step: %.2e s rss: %7.1f MB" %
+          (res["selector"], res["n"], res["k"], res["dtype"],
+           res["backend"], res["setup"], res["select"], res["step"],
+           res["peak_rss_mb"]))
+    if phases:
+        print("          " + " ".join(
+            "%s: %.3f s" % item for item in sorted(res["phases"].items())))
+
+
+def _key(res):
+    """ Identify a case """
+    return (res["selector"], res["n"], res["k"], res["dtype"],
+            res.get("ndim", 2), res.get("backend", "numpy"))
+
+
+def compare(results, baseline, tolerance=1.5, mintime=0.05):
+    """Find the cases slower than a baseline run
+
+    Parameters
+    ----------
+    results, baseline : list
+        Benchmark results, see run.
+
+    tolerance : float, optional, default: 1.5
+        Largest accepted ratio between the new and the baseline time.
+
+    mintime : float, optional, default: 0.05
+        Times below mintime seconds are too noisy and are not compared.
+
+    Returns
+    ------
+    regressions : list
+        (case, measure, baseline time, new time) of the slower cases.
+    """
+    base = dict((_key(res), res) for res in baseline)
+    regressions = []
+    for res in results:
+        ref = base.get(_key(res))
+        if ref is None or "failed" in res or "failed" in ref:
+            continue
+        for measure in ("setup", "select"):
+            if max(res[measure], ref[measure]) < mintime:
+                continue
+            if res[measure] > tolerance*ref[measure]:
+                regressions.append((_key(res), measure, ref[measure],
+                                    res[measure]))
+    return regressions
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-s", "--selectors", nargs="+", default=SELECTORS,
+                        choices=SELECTORS)
+    parser.add_argument("-n", "--sizes", nargs="+", type=int,
+                        default=[500, 1000, 2000])
+    parser.add_argument("-k", "--nselects", nargs="+", type=int,
+                        default=[10, 100])
+    parser.add_argument("-t", "--dtypes", nargs="+",
+                        default=["float64", "float32"])
+    parser.add_argument("-d", "--ndim", type=int, default=2)
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("-b", "--backends", nargs="+", default=["numpy"],
+                        help="compute backends, see optobj.backend")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds after which a run is killed")
+    parser.add_argument("-p", "--phases", action="store_true",
+                        help="record the time of the step phases")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--label", default="",
+                        help="free text stored with the results, "
+                             "e.g. the commit id")
+    parser.add_argument("--compare", help="baseline JSON results")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="slowdown ratio accepted by --compare")
+    args = parser.parse_args(argv)
+
+    results = run(args.selectors, args.sizes, args.nselects, args.dtypes,
+                  args.ndim, args.repeat, args.phases,
+                  backends=args.backends, timeout=args.timeout)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fout:
+            json.dump({"label": args.label,
+                       "python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "machine": platform.platform(),
+                       "results": results}, fout, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fin:
+            baseline = json.load(fin)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for case, measure, tref, tnew in regressions:
+            print("REGRESSION %s %s: %.3f s -> %.3f s" %
+                  (" ".join(str(item) for item in case), measure, tref,
+                   tnew))
+        if regressions:
+            return 1
+    return 1 if any("failed" in res for res in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Checkpoint and resume of the object selections
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import json
+import os
+import tempfile
+from time import monotonic
+
+from numpy import array, load as npload, savez_compressed
+
+from optobj.disc import DISC
+from optobj.knn import KNNMDC
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+SELECTORS = {"MDC": MDC, "KS": KS, "DISC": DISC, "KNNMDC": KNNMDC}
+
+# Format of the snapshot files
+VERSION = 1
+
+
+def save(selector, filename):
+    """Write a snapshot of a selection
+
+    The snapshot is a compressed npz file with the selected ids, the
+    score vector (MDC info_, KS mind_ or DISC dis_), the random
+    generator state of DISC and the selector parameters. It is written
+    to a temporary file in the same directory and renamed over filename,
+    so a crash leaves either the previous snapshot or the new one.
+
+    Parameters
+    ----------
+    selector : MDC, KNNMDC, KS or DISC
+        The selector, possibly in the middle of an iter_select loop.
+
+    filename : string
+        Path of the snapshot.
+    """
+    name = type(selector).__name__
+    if name not in SELECTORS:
+        raise ValueError("Unknown selector %s" % (name))
+    params, arrays = selector._getstate()
+    header = json.dumps({"version": VERSION,
+                         "selector": name,
+                         "params": params})
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fout:
+            savez_compressed(fout, header=array(header), **arrays)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+def load(filename, data, observer=None, **params):
+    """Restore a selection from a snapshot
+
+    Parameters
+    ----------
+    filename : string
+        Path of a snapshot written by save.
+
+    data : array or distance storage
+        The distance matrix, the feature matrix of KS or the graph
+        of KNNMDC the selection was started with. It is not stored in
+        the snapshot.
+
+    observer : callable, optional, default: None
+        Observer of the restored selector, e.g. a new Checkpointer.
+
+    **params :
+        Parameters overriding the saved ones, e.g. n_jobs.
+
+    Returns
+    ------
+    selector : MDC, KNNMDC, KS or DISC
+        The selector ready to continue with iter_select, getnext or
+        select. The remaining picks are the ones of the interrupted run.
+    """
+    with npload(filename) as snap:
+        header = json.loads(str(snap["header"]))
+        arrays = dict((key, snap[key]) for key in snap.files
+                      if key != "header")
+    if header["version"] != VERSION:
+        raise ValueError("Unsupported snapshot version %s" %
+                         (header["version"]))
+    saved = header["params"]
+    saved.update(params)
+    return SELECTORS[header["selector"]]._fromstate(data, saved, arrays,
+                                                    observer)
+
+
+class Checkpointer(object):
+    """Observer saving snapshots of a selection at regular intervals
+
+    Pass an instance as the observer argument of MDC, KNNMDC, KS or DISC.
+    A snapshot is written when one of the intervals has elapsed
+    since the previous one.
+
+    Parameters
+    ----------
+    filename : string
+        Path of the snapshot, overwritten at every save.
+
+    every : int, optional, default: 100
+        Number of selected objects between two snapshots.
+        0 disables the step interval.
+
+    seconds : float, optional, default: None
+        Time between two snapshots. None disables the time interval.
+
+    observer : callable, optional, default: None
+        Observer receiving every StepEvent, e.g. a StepRecorder.
+
+    Attributes
+    ----------
+    step_ : int
+        Selection step of the last snapshot.
+
+    nsaved_ : int
+        Number of snapshots written.
+    """
+
+    def __init__(self, filename, every=100, seconds=None, observer=None):
+        self.filename = filename
+        self.every = every
+        self.seconds = seconds
+        self.observer = observer
+        self.step_ = 0
+        self.nsaved_ = 0
+        self._last = monotonic()
+
+    def __call__(self, event):
+        if self.observer is not None:
+            self.observer(event)
+        due = 0 < self.every <= event.step - self.step_
+        if self.seconds is not None:
+            due = due or monotonic() - self._last >= self.seconds
+        if due:
+            self.save(event.selector, event.step)
+
+    def save(self, selector, step=None):
+        """ Write a snapshot now """
+        save(selector, self.filename)
+        self.step_ = step if step is not None else self.step_
+        self.nsaved_ += 1
+        self._last = monotonic()
@@ -0,0 +1,151 @@
+"""
+Comparison of the selections obtained with different distance metrics
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+
+from numpy import asarray, dot, outer, sqrt, zeros
+
+from optobj.disc import DISC
+from optobj.distance import BLOCK_CELLS
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+# Working memory of a selection besides the distance matrix:
+# a block of ranked cells costs the distances, the order, the
+# target ids and the weights
+WORKBYTES = BLOCK_CELLS * 32
+
+# Features shared by the tasks of a worker process
+_X = None
+
+
+def _init(x):
+    """ Keep the features in the worker process """
+    global _X
+    _X = x
+
+
+def _metric(metric):
+    """ Split a metric into its name and its pdist keyword arguments """
+    if isinstance(metric, str):
+        return metric, {}
+    return metric[0], dict(metric[1])
+
+
+def _select(metric, method, nobjects, dtype, random_state):
+    """ Compute the distances of a metric and run its selection """
+    from scipy.spatial.distance import pdist
+    name, kwargs = _metric(metric)
+    dmx = pdist(_X, name, **kwargs).astype(dtype, copy=False)
+    if method == "mdc":
+        sel = MDC(dmx, nobjects)
+    elif method == "ks":
+        sel = KS(dmx, nobjects, "precomputed")
+    else:
+        sel = DISC(dmx, method, nobjects, random_state=random_state)
+    ids = sel.select()
+    # drop the matrix before the result goes back
+    del sel, dmx
+    return ids
+
+
+def taskbytes(nobjects, dtype="float64"):
+    """ Estimated peak memory in bytes of the selection of one metric """
+    itemsize = asarray(0, dtype=dtype).itemsize
+    # pdist returns float64 before the conversion to dtype
+    return nobjects*(nobjects-1)//2 * (8 + itemsize) + WORKBYTES
+
+
+def agreement(selections):
+    """Cosine similarity between every pair of selections
+
+    Parameters
+    ----------
+    selections : list
+        Lists of selected ids.
+
+    Returns
+    ------
+    cosdmx : array, shape(len(selections), len(selections))
+        |A & B| / sqrt(|A| |B|), the cosine similarity of the
+        indicator vectors of the selected objects.
+    """
+    row = max([max(ids) + 1 for ids in selections if len(ids) > 0] + [0])
+    ind = zeros((len(selections), row))
+    for i, ids in enumerate(selections):
+        ind[i, ids] = 1.0
+    sizes = ind.sum(axis=1)
+    norm = sqrt(outer(sizes, sizes))
+    norm[norm == 0] = 1.0
+    return dot(ind, ind.T) / norm
+
+
+def compare_metrics(x, metrics, nobjects=20, method="mdc", dtype="float64",
+                    maxmemory=None, n_jobs=-1, random_state=None):
+    """Run the same selection with different distance metrics
+
+    Every metric is a task of a process pool: the worker computes the
+    condensed distance matrix with scipy pdist, runs the selection and
+    returns only the selected ids, so the matrix is freed as soon as
+    its selection is done. The number of concurrent tasks is bounded
+    by maxmemory.
+
+    Parameters
+    ----------
+    x : array, shape(row,col)
+        The feature matrix.
+
+    metrics : list
+        pdist metric names, or (name, kwargs) pairs such as
+        ("minkowski", {"p": 1}).
+
+    nobjects : int, optional, default: 20
+        Number of object to select, see the selector.
+
+    method : string, optional, default: mdc
+        mdc, ks or one of the DISC methods max, min, med, sum.
+
+    dtype : string, optional, default: float64
+        Data type of the distance matrices.
+
+    maxmemory : int, optional, default: None
+        Memory budget in bytes of the running tasks, see taskbytes.
+        One task at a time runs when a single one does not fit.
+        None means no limit.
+
+    n_jobs : int, optional, default: -1
+        Number of worker processes. -1 means all the CPUs.
+
+    random_state : int, optional, default: None
+        Seed of the DISC first pick, the same for every metric.
+
+    Returns
+    ------
+    selections : list
+        The selected ids for every metric.
+
+    cosdmx : array, shape(len(metrics), len(metrics))
+        Agreement between the selections, see agreement.
+
+    Notes
+    -----
+    See examples/plot_mdc_different_metrix_example.py for an example.
+    """
+    x = asarray(x)
+    method = method.lower().strip()
+    if n_jobs < 0:
+        n_jobs = cpu_count() or 1
+    workers = max(1, min(n_jobs, len(metrics)))
+    if maxmemory is not None:
+        workers = max(1, min(workers, maxmemory // taskbytes(len(x), dtype)))
+    with ProcessPoolExecutor(workers, initializer=_init,
+                             initargs=(x,)) as pool:
+        futures = [pool.submit(_select, metric, method, nobjects, dtype,
+                               random_state)
+                   for metric in metrics]
+        selections = [future.result() for future in futures]
+    return selections, agreement(selections)
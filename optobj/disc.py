@@ -4,16 +4,34 @@ Maximum dissimilarity object selection
 # Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
 # License: BSD 3 clause
 
-from random import randrange
-import time
+import random
+from numbers import Integral
 
-def _median(lst):
-    """ Get mediane of list """
-    slst = sorted(lst)
-    if len(slst) % 2 != 0:
-        return slst[len(slst)/2]
-    else:
-        return (slst[len(slst)/2] + slst[len(slst)/2-1])/2.0
+from numpy import (array, asarray, concatenate, float64, int64, isnan, nan,
+                   partition, uint32, zeros)
+
+from optobj.backend import get_backend
+from optobj.distance import asdistance, blockrows
+from optobj.profiling import PhaseTimer, notify
+from optobj.shard import iter_sharded
+
+
+def _rng(random_state):
+    """ Random generator of the first pick """
+    if random_state is None:
+        # the module functions share the global generator
+        return random
+    if isinstance(random_state, random.Random):
+        return random_state
+    return random.Random(random_state)
+
+def _median(dis):
+    """ Get the median of every column of dis """
+    half = len(dis) // 2
+    if len(dis) % 2 != 0:
+        return partition(dis, half, axis=0)[half]
+    part = partition(dis, (half-1, half), axis=0)
+    return (part[half] + part[half-1])/2.0
 
 
 class DISC(object):
@@ -27,8 +45,9 @@ class DISC(object):
 
     Parameters
     ----------
-    dmx : array, shape(row,row)
-        A square distance matrix.
+    dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+        A square distance matrix or a condensed distance matrix
+        as returned by scipy pdist. float32 matrices are not converted.
         To build a distance matrix see scipy at:
         http://docs.scipy.org/doc/scipy/reference/spatial.distance.html
 
@@ -40,6 +59,38 @@ class DISC(object):
         Select the dissimilarity method. Available methods are:
         Max, Min, Med, Sum
 
+    blocksize : int, optional, default: None
+        Number of candidate objects processed at once by the
+        Med method. None means a block size that keeps the
+        working memory around 64 MB.
+
+    n_jobs : int, optional, default: 1
+        Number of worker processes for the Max, Min and Sum methods.
+        Every process holds a slice of the distance matrix rows and
+        of the aggregate distance vector. -1 means all the CPUs.
+
+    observer : callable, optional, default: None
+        Called with an optobj.profiling.StepEvent after every selected
+        object, with the phase timings and the number of distances read.
+
+    random_state : int or random.Random, optional, default: None
+        Generator of the random first pick. None means the global
+        generator of the random module, an int seeds a private one.
+
+    Attributes
+    ----------
+    dis_ : array, shape (row_,)
+        Running minimum, maximum or sum of the distances between
+        every object and the selected objects. With Med it holds
+        the medians computed at the last step.
+
+    selected_ : array, shape (row_,)
+        Boolean mask of the selected objects.
+
+    random_ : random.Random or module
+        Generator of the first pick. Its state is saved by
+        optobj.checkpoint.
+
     Returns
     ------
     disids: list
@@ -57,154 +108,144 @@ class DISC(object):
     Journal of Biomolecular Screening Vol. 1, Number 3, pag 145-151, 1996
     """
 
-    def __init__(self, dmx, method, nobjects=0):
-        try:
-            self.dmx_ = dmx.tolist() #convert to list to be faster
-        except AttributeError:
-            self.dmx_ = dmx
+    def __init__(self, dmx, method, nobjects=0, blocksize=None, n_jobs=1,
+                 observer=None, random_state=None):
+        self.dmx_ = asdistance(dmx)
         self.nobjects = nobjects
+        self.blocksize = blocksize
+        self.n_jobs = n_jobs
+        self.observer = observer
+        self.random_state = random_state
+        self.random_ = _rng(random_state)
         self.disids = []
         self.method = method.lower().strip()
+        self.dis_ = None
+        self.selected_ = None
+        self._shards = None
 
     def dislist(self):
         """ Return the list of dissimilar compounds """
         return self.disids
 
+    def iter_select(self):
+        """Yield the dissimilar compounds one at a time
+
+        The first compound is picked at random, the aggregate distances
+        are updated before every id is yielded, so the iteration can be
+        stopped at any point and resumed with another iter_select or
+        select call. All the objects are yielded unless the consumer
+        stops.
+        """
+        if not self.disids:
+            self._append(self.random_.randrange(0, len(self.dmx_)))
+            yield self.disids[-1]
+        if self.method != "med" and self.n_jobs != 1:
+            yield from self._iter_sharded()
+            return
+        while len(self.disids) < len(self.dmx_):
+            if self.method == "med":
+                self._appendnext_med()
+            else:
+                self._appendnext()
+            yield self.disids[-1]
+
     def select(self):
         """ Run the Dissimilarity selection"""
-        self.disids.append(randrange(0, len(self.dmx_)))
-
-        if self.method == "min":
-            while len(self.disids) < self.nobjects:
-                self._appendnext_min()
-        elif self.method == "med":
-            while len(self.disids) < self.nobjects:
-                self._appendnext_med()
-        elif self.method == "sum":
-            while len(self.disids) < self.nobjects:
-                self._appendnext_sum()
-        else:
-            while len(self.disids) < self.nobjects:
-                self._appendnext_max()
+        nobjects = min(max(self.nobjects, 1), len(self.dmx_))
+        if len(self.disids) < nobjects:
+            selection = self.iter_select()
+            for _ in selection:
+                if len(self.disids) >= nobjects:
+                    break
+            selection.close()
         return self.dislist()
 
+    def _iter_sharded(self):
+        """ Run the Min, Max or Sum selection on worker processes """
+        aggregate = self.method if self.method in ("min", "sum") else "max"
+        return iter_sharded(self, self.disids, self.dmx_, False, aggregate,
+                            True, "dis_")
+
+    def _getstate(self):
+        """ Parameters and arrays saved by optobj.checkpoint """
+        params = {"method": self.method,
+                  "nobjects": self.nobjects,
+                  "blocksize": self.blocksize,
+                  "n_jobs": self.n_jobs}
+        if isinstance(self.random_state, Integral):
+            params["random_state"] = int(self.random_state)
+        version, state, gauss = self.random_.getstate()
+        params["rng_version"] = version
+        arrays = {"ids": array(self.disids, dtype=int64),
+                  "rng_state": array(state, dtype=uint32),
+                  "rng_gauss": array(nan if gauss is None else gauss)}
+        if self._shards is not None:
+            arrays["dis"] = concatenate(self._shards.scores())
+        elif self.dis_ is not None:
+            arrays["dis"] = self.dis_
+        return params, arrays
+
+    @classmethod
+    def _fromstate(cls, dmx, params, arrays, observer=None):
+        """ Rebuild a selector saved by _getstate """
+        params = dict(params)
+        version = params.pop("rng_version")
+        sel = cls(dmx, observer=observer, **params)
+        gauss = float(arrays["rng_gauss"])
+        sel.random_ = random.Random()
+        sel.random_.setstate((version, tuple(arrays["rng_state"].tolist()),
+                              None if isnan(gauss) else gauss))
+        sel.disids = arrays["ids"].tolist()
+        if sel.disids:
+            sel.selected_ = zeros(len(sel.dmx_), dtype=bool)
+            sel.selected_[sel.disids] = True
+            sel.dis_ = asarray(arrays["dis"], dtype=float64)
+        return sel
+
+    def _append(self, objid, timer=None, lookups=0):
+        """ Append objid and update the aggregate distance vector """
+        if timer is None and self.observer is not None:
+            timer = PhaseTimer()
+        row = asarray(self.dmx_.row(objid), dtype=float64)
+        if self.selected_ is None:
+            self.selected_ = zeros(len(row), dtype=bool)
+            self.dis_ = row.copy()
+        elif self.method in ("min", "sum"):
+            get_backend().aggregate(self.dis_, row, self.method)
+        elif self.method != "med":
+            get_backend().aggregate(self.dis_, row, "max")
+        if timer is not None:
+            timer.lap("update")
+        self.selected_[objid] = True
+        self.disids.append(int(objid))
+        if timer is not None:
+            notify(self, timer, len(self.disids), objid, lookups+len(row))
+
+    def _appendnext(self, timer=None, lookups=0):
+        """ Append the unselected object with the largest aggregate distance
+
+        The aggregate is the minimum (single linkage), maximum
+        (complete linkage) or sum (group average) of the distances
+        to the selected objects. Ties go to the highest object id.
+        """
+        if timer is None and self.observer is not None:
+            timer = PhaseTimer()
+        objid = get_backend().masked_argmax(self.dis_, self.selected_, True)
+        if timer is not None:
+            timer.lap("argmax")
+        self._append(objid, timer, lookups)
+
     def _appendnext_med(self):
-        """ Append the next object following the sum dissimilarity """
-        # first column is the distance and second is the objectid
-        dis = [[0, i] for i in range(len(self.dmx_))]
-        for i in range(len(self.dmx_)):
-            if i not in self.disids:
-                dlist = []
-                for j in range(len(self.disids)):
-                    dlist.append(self.dmx_[i][self.disids[j]])
-                dis[i][0] = _median(dlist)
-            else:
-                continue
-        # first column is the distance and second is the objectid
-        dis = sorted(dis, key=lambda item: item[0])
-        # Select the object with the maximum distances
-        # between all the summed distances list
-        # and this is the last object in list
-        self.disids.append(dis[-1][-1])
-
-    def _appendnext_sum(self):
         """ Append the next object following the median dissimilarity """
-        # first column is the distance and second is the objectid
-        dis = [[0, i] for i in range(len(self.dmx_))]
-        for i in range(len(self.disids)):
-            for j in range(len(self.dmx_)):
-                if j not in self.disids:
-                    dis[j][0] += self.dmx_[self.disids[i]][j]
-                else:
-                    continue
-        # first column is the distance and second is the objectid
-        dis = sorted(dis, key=lambda item: item[0])
-        # Select the object with the maximum distances
-        # between all the summed distances list
-        # and this is the last object in list
-        self.disids.append(dis[-1][-1])
-
-    def _appendnext_max(self):
-        """ Append the next object following the maximum dissimilarity """
-        dis = [[0, i] for i in range(len(self.dmx_))]
-        for i in range(len(self.dmx_)):
-            if i not in self.disids:
-                maxdisid = 0
-                maxdis = self.dmx_[i][self.disids[maxdisid]]
-                for j in range(1, len(self.disids)):
-                    if self.dmx_[i][self.disids[j]] > maxdis:
-                        maxdis = self.dmx_[i][self.disids[j]]
-                        maxdisid = i
-                    else:
-                        continue
-                dis[i][0] = maxdis
-            else:
-                continue
-        # first column is the distance and second is the objectid
-        dis = sorted(dis, key=lambda item: item[0])
-        # Select the object with the max distances
-        # between all the minimum distances list
-        # and this is the last object in list
-        self.disids.append(dis[-1][-1])
-
-    def _appendnext_min(self):
-        """ Append the next object following the minimum dissimilarity """
-        dis = [[0, i] for i in range(len(self.dmx_))]
-        t = time.time()
-        for i in range(len(self.dmx_)):
-            if i not in self.disids:
-                mindis = self.dmx_[i][self.disids[0]]
-                for j in range(1, len(self.disids)):
-                    if self.dmx_[i][self.disids[j]] < mindis:
-                        mindis = self.dmx_[i][self.disids[j]]
-                    else:
-                        continue
-                dis[i][0] = mindis
-            else:
-                continue
-        print "Time1: %.3f" % (time.time()-t)
-        t = time.time()
-        # first column is the distance and second is the objectid
-        dis = sorted(dis, key=lambda item: item[0])
-        print "Time2: %.3f" % (time.time()-t)
-        # Select the object with the max distances
-        # between all the minimum distances list
-        # and this is the last object in list
-        self.disids.append(dis[-1][-1])
-        print "-"*10
-
-    def _appendnext_min2(self):
-        """ Append the next object following the minimum dissimilarity """
-        t = time.time()
-        dis = []
-        for i in range(len(self.disids)):
-            mindis = None
-            objid = None
-            for j in range(len(self.dmx_[int(self.disids[i])])):
-                if self.disids[i] != j and j not in self.disids:
-                    if mindis == None:
-                        mindis = self.dmx_[int(self.disids[i])][j]
-                        objid = j
-                    elif self.dmx_[int(self.disids[i])][j] > mindis:
-                        mindis = self.dmx_[int(self.disids[i])][j]
-                        objid = j
-                    else:
-                        continue
-                else:
-                  continue
-
-            if mindis != None:
-                dis.append([mindis, objid])
-            else:
-                continue
-
-        print "Time1: %.3f" % (time.time()-t)
-        t = time.time()
-        # first column is the distance and second is the objectid
-        dis = sorted(dis, key=lambda item: item[0])
-        print "Time2: %.3f" % (time.time()-t)
-        # Select the object with the max distances
-        # between all the minimum distances list
-        # and this is the last object in list
-        self.disids.append(dis[-1][-1])
-        print "-"*10
+        timer = PhaseTimer() if self.observer is not None else None
+        # medians are computed on blocks of candidates taken from
+        # the rows of the selected objects, to bound the memory
+        sel = array(self.disids)
+        row = len(self.dmx_)
+        step = blockrows(row, len(sel), self.blocksize)
+        for start in range(0, row, step):
+            stop = min(start+step, row)
+            self.dis_[start:stop] = _median(self.dmx_.take(sel, start, stop))
+        if timer is not None:
+            timer.lap("update")
+        self._appendnext(timer, len(sel)*row)
@@ -0,0 +1,525 @@
+"""
+Distance matrix storages read by the object selection algorithms
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from contextlib import contextmanager
+from math import sqrt
+
+from numpy import (arange, asarray, concatenate, empty, inf, int64, ix_,
+                   maximum, memmap, minimum, ndarray, zeros)
+
+# Number of matrix cells read at once when no block size is given.
+# Ranking a cell costs an int64 index plus a float64 weight.
+BLOCK_CELLS = 1 << 22
+
+
+def blockrows(nrows, ncols, blocksize=None):
+    """ Return the number of rows to process in one block """
+    if blocksize is not None and blocksize > 0:
+        return int(blocksize)
+    return max(1, min(nrows, BLOCK_CELLS // max(ncols, 1)))
+
+
+class SquareDistance(object):
+    """Square distance matrix
+
+    Rows are returned as views of the matrix, which keeps its dtype,
+    so that a float32 matrix costs 4 bytes per cell.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row)
+        A square distance matrix.
+    """
+
+    def __init__(self, dmx):
+        self.dmx = asarray(dmx)
+        if self.dmx.ndim != 2 or self.dmx.shape[0] != self.dmx.shape[1]:
+            raise ValueError("Distance matrix must be square")
+
+    def __len__(self):
+        return self.dmx.shape[0]
+
+    @property
+    def dtype(self):
+        """ Data type of the distances """
+        return self.dmx.dtype
+
+    def row(self, i):
+        """ Distances between object i and all the objects """
+        return self.dmx[i]
+
+    def rows(self, start, stop):
+        """ Distances between the objects start..stop and all the objects """
+        return self.dmx[start:stop]
+
+    def take(self, ids, start, stop):
+        """ Distances between the objects ids and the objects start..stop """
+        return self.dmx[asarray(ids), start:stop]
+
+    def pairs(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        return self.dmx[ix_(asarray(ids), asarray(cols))]
+
+
+class CondensedDistance(object):
+    """Condensed distance matrix
+
+    The upper triangle of the distance matrix stored row by row
+    as returned by scipy.spatial.distance.pdist. Rows are gathered with
+    index arithmetic, so the square matrix is never built.
+
+    Parameters
+    ----------
+    dmx : array, shape(row*(row-1)/2,)
+        A condensed distance matrix.
+    """
+
+    def __init__(self, dmx):
+        self.dmx = asarray(dmx)
+        size = len(self.dmx)
+        self.nrows = int(round((1 + sqrt(1 + 8*size))/2))
+        if self.dmx.ndim != 1 or self.nrows*(self.nrows-1)//2 != size:
+            raise ValueError("Wrong condensed distance matrix size")
+
+    def __len__(self):
+        return self.nrows
+
+    @property
+    def dtype(self):
+        """ Data type of the distances """
+        return self.dmx.dtype
+
+    def _index(self, i, j):
+        """ Position of the distances (i, j) with i != j """
+        low = minimum(i, j).astype(int64)
+        high = maximum(i, j).astype(int64)
+        return self.nrows*low - low*(low+1)//2 + high - low - 1
+
+    def _gather(self, i, j):
+        """ Distances (i, j) with the diagonal set to zero """
+        diagonal = i == j
+        if len(self.dmx) == 0:
+            # a single object, only its zero distance from itself
+            return zeros(diagonal.shape, dtype=self.dmx.dtype)
+        index = self._index(i, j)
+        index[diagonal] = 0
+        dis = self.dmx[index]
+        dis[diagonal] = 0
+        return dis
+
+    def row(self, i):
+        """ Distances between object i and all the objects """
+        # the distances after i are contiguous, the ones before i
+        # are one per previous row
+        start = self.nrows*i - i*(i+1)//2
+        return concatenate((self.dmx[self._index(arange(i), i)],
+                            zeros(1, dtype=self.dmx.dtype),
+                            self.dmx[start:start+self.nrows-i-1]))
+
+    def rows(self, start, stop):
+        """ Distances between the objects start..stop and all the objects """
+        # every part is read with increasing offsets, but the columns
+        # before start are a strided chunk of every previous row: a
+        # memory mapped file is swept up to the block once per block
+        stop = min(stop, self.nrows)
+        ids = arange(start, stop)
+        block = empty((len(ids), self.nrows), dtype=self.dmx.dtype)
+        if start > 0:
+            # one contiguous chunk in each previous row
+            index = self._index(arange(start)[:, None], ids[None, :])
+            block[:, :start] = self.dmx[index].T
+        block[:, start:stop] = self._gather(ids[:, None], ids[None, :])
+        if stop < self.nrows:
+            # the contiguous tail of each row of the block
+            index = self._index(ids[:, None],
+                                arange(stop, self.nrows)[None, :])
+            block[:, stop:] = self.dmx[index]
+        return block
+
+    def take(self, ids, start, stop):
+        """ Distances between the objects ids and the objects start..stop """
+        return self._gather(asarray(ids)[:, None],
+                            arange(start, min(stop, self.nrows))[None, :])
+
+    def pairs(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        return self._gather(asarray(ids)[:, None], asarray(cols)[None, :])
+
+
+class FeatureDistance(object):
+    """Distances computed on request from a feature matrix
+
+    No matrix is stored: every row is computed with scipy cdist when
+    it is read, so the memory is O(row*col) and a selection on a
+    million objects does not need the row*row matrix.
+
+    Parameters
+    ----------
+    x : array, shape(row,col)
+        The feature matrix.
+
+    metric : string, optional, default: euclidean
+        Any metric accepted by scipy.spatial.distance.cdist.
+
+    dtype : string, optional, default: float64
+        Data type of the returned distances.
+    """
+
+    def __init__(self, x, metric="euclidean", dtype="float64"):
+        from scipy.spatial.distance import cdist
+        self.x = asarray(x)
+        self.metric = metric
+        self._dtype = dtype
+        self._cdist = cdist
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def dtype(self):
+        """ Data type of the distances """
+        return asarray(0, dtype=self._dtype).dtype
+
+    def row(self, i):
+        """ Distances between object i and all the objects """
+        return self.rows(i, i+1)[0]
+
+    def rows(self, start, stop):
+        """ Distances between the objects start..stop and all the objects """
+        return self._cdist(self.x[start:stop], self.x,
+                           self.metric).astype(self._dtype, copy=False)
+
+    def take(self, ids, start, stop):
+        """ Distances between the objects ids and the objects start..stop """
+        return self._cdist(self.x[asarray(ids)], self.x[start:stop],
+                           self.metric).astype(self._dtype, copy=False)
+
+    def pairs(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        return self._cdist(self.x[asarray(ids)], self.x[asarray(cols)],
+                           self.metric).astype(self._dtype, copy=False)
+
+    def nearest(self, nnear):
+        """Ids and distances of the nnear nearest objects of every object
+
+        Euclidean, cityblock and chebyshev distances are answered with
+        a k-d tree, the other metrics return None. Ties are not in id
+        order.
+        """
+        norms = {"euclidean": 2, "cityblock": 1, "chebyshev": inf}
+        if self.metric not in norms:
+            return None
+        from scipy.spatial import cKDTree
+        nnear = min(max(nnear, 1), len(self.x))
+        dis, nbrs = cKDTree(self.x).query(self.x, nnear,
+                                          p=norms[self.metric])
+        shape = (len(self.x), nnear)
+        return (nbrs.reshape(shape).astype(int64),
+                dis.reshape(shape).astype(self._dtype))
+
+
+class SubsetDistance(object):
+    """Distances between the objects of a subset of a distance storage
+
+    Only the distances between the subset objects are read from the
+    parent storage, with its pairs method when it has one, so a subset
+    of m objects costs O(m*m) reads and no copy of the parent matrix.
+
+    Parameters
+    ----------
+    dmx : array or distance storage
+        The distance matrix of all the objects.
+
+    ids : array, shape(m,)
+        Ids of the subset objects in dmx. Object i of the subset is
+        object ids[i] of dmx.
+    """
+
+    def __init__(self, dmx, ids):
+        self.dmx = asdistance(dmx)
+        self.ids = asarray(ids, dtype=int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dtype(self):
+        """ Data type of the distances """
+        return self.dmx.dtype
+
+    def _pairs(self, ids, cols):
+        """ Distances between the parent objects ids and cols """
+        if hasattr(self.dmx, "pairs"):
+            return self.dmx.pairs(ids, cols)
+        return self.dmx.take(ids, 0, len(self.dmx))[:, cols]
+
+    def row(self, i):
+        """ Distances between object i and all the objects """
+        return self._pairs(self.ids[i:i+1], self.ids)[0]
+
+    def rows(self, start, stop):
+        """ Distances between the objects start..stop and all the objects """
+        return self._pairs(self.ids[start:stop], self.ids)
+
+    def take(self, ids, start, stop):
+        """ Distances between the objects ids and the objects start..stop """
+        return self._pairs(self.ids[asarray(ids)], self.ids[start:stop])
+
+    def pairs(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        return self._pairs(self.ids[asarray(ids)], self.ids[asarray(cols)])
+
+
+def asdistance(dmx):
+    """Wrap a distance matrix into a distance storage
+
+    Parameters
+    ----------
+    dmx : array
+        A square distance matrix, a condensed distance matrix as
+        returned by scipy pdist, or a distance storage.
+
+    Returns
+    ------
+    storage : SquareDistance or CondensedDistance
+        The distance storage. Arrays are not copied.
+    """
+    if hasattr(dmx, "row") and hasattr(dmx, "rows"):
+        return dmx
+    dmx = asarray(dmx)
+    if dmx.ndim == 1:
+        return CondensedDistance(dmx)
+    return SquareDistance(dmx)
+
+
+def _layout(layout):
+    """ Normalize the name of a file layout """
+    name = layout.lower().strip()
+    if name not in ("square", "condensed"):
+        raise ValueError("Unknown layout %s" % (layout))
+    return name
+
+
+def memmap_distance(filename, nobjects, dtype="float64", layout="square",
+                    mode="r", offset=0):
+    """Open a distance matrix stored in a binary file
+
+    The file is memory mapped and the selectors read it in sequential
+    blocks of rows. With the square layout every block is a contiguous
+    part of the file, so a selection reads the file in one forward pass
+    and the matrix can be larger than the memory.
+
+    Parameters
+    ----------
+    filename : string
+        Raw binary file in C order, as written by ndarray.tofile.
+
+    nobjects : int
+        Number of objects of the distance matrix.
+
+    dtype : string, optional, default: float64
+        Data type of the distances.
+
+    layout : string, optional, default: square
+        square for a row*row matrix, condensed for the row*(row-1)/2
+        upper triangle as returned by scipy pdist. A block of condensed
+        rows also gathers a strided chunk from every previous row, so
+        the file is swept once per block: use it only when the file
+        fits in the page cache, and square for larger matrices.
+
+    mode : string, optional, default: r
+        The np.memmap mode. Use w+ to create a new file.
+
+    offset : int, optional, default: 0
+        Offset in bytes of the matrix in the file.
+
+    Returns
+    ------
+    storage : SquareDistance or CondensedDistance
+        The distance storage. The memmap is the dmx attribute.
+    """
+    layout = _layout(layout)
+    if layout == "square":
+        shape = (nobjects, nobjects)
+        storage = SquareDistance
+    else:
+        shape = (nobjects*(nobjects-1)//2,)
+        storage = CondensedDistance
+    return storage(memmap(filename, dtype=dtype, mode=mode, offset=offset,
+                          shape=shape))
+
+
+def write_distance(filename, x, metric="euclidean", dtype="float32",
+                   layout="square", blocksize=None):
+    """Compute a distance matrix into a binary file
+
+    Distances are computed with scipy cdist on blocks of rows and
+    written sequentially, so the matrix never needs to fit in memory.
+
+    Parameters
+    ----------
+    filename : string
+        Output file.
+
+    x : array, shape(row,col)
+        The feature matrix.
+
+    metric : string, optional, default: euclidean
+        Any metric accepted by scipy.spatial.distance.cdist.
+
+    dtype : string, optional, default: float32
+        Data type of the stored distances.
+
+    layout : string, optional, default: square
+        square or condensed, see memmap_distance.
+
+    blocksize : int, optional, default: None
+        Number of rows computed at once. None means a block size
+        that keeps the working memory around 64 MB.
+
+    Returns
+    ------
+    storage : SquareDistance or CondensedDistance
+        The distance storage opened in read mode.
+    """
+    from scipy.spatial.distance import cdist
+    layout = _layout(layout)
+    row = len(x)
+    step = blockrows(row, row, blocksize)
+    with open(filename, "wb") as fout:
+        for start in range(0, row, step):
+            stop = min(start+step, row)
+            dis = cdist(x[start:stop], x, metric).astype(dtype)
+            if layout == "condensed":
+                for i in range(start, stop):
+                    dis[i-start, i+1:].tofile(fout)
+            else:
+                dis.tofile(fout)
+    return memmap_distance(filename, row, dtype, layout)
+
+
+def _mapped(mx):
+    """ File memory map holding the whole array mx, or None """
+    # asarray keeps the memmap of memmap_distance as the base
+    mapped = mx if isinstance(mx, memmap) else mx.base
+    if (isinstance(mapped, memmap) and mapped.filename is not None and
+            mapped.shape == mx.shape):
+        return mapped
+    return None
+
+
+def needs_copy(dmx):
+    """ True when share copies the matrix dmx into shared memory """
+    dmx = asdistance(dmx)
+    return (isinstance(dmx, (SquareDistance, CondensedDistance)) and
+            _mapped(dmx.dmx) is None)
+
+
+def share(dmx):
+    """Describe a distance storage for worker processes
+
+    Arrays are copied once into a shared memory block, memory mapped
+    files are reopened read only by every worker and the other storages
+    are pickled.
+
+    Parameters
+    ----------
+    dmx : array or distance storage
+        The distance matrix.
+
+    Returns
+    ------
+    spec : tuple
+        Picklable description, see attach.
+
+    shm : SharedMemory or None
+        The block holding the copy. The caller closes and unlinks it
+        when the workers are done.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+    dmx = asdistance(dmx)
+    if isinstance(dmx, (SquareDistance, CondensedDistance)):
+        kind = type(dmx)
+        mx = dmx.dmx
+        mapped = _mapped(mx)
+        if mapped is not None:
+            return ("memmap", kind, mapped.filename, mx.dtype.str, mx.shape,
+                    mapped.offset), None
+        shm = SharedMemory(create=True, size=max(mx.nbytes, 1))
+        ndarray(mx.shape, dtype=mx.dtype, buffer=shm.buf)[...] = mx
+        return ("shm", kind, shm.name, mx.dtype.str, mx.shape), shm
+    return ("storage", dmx), None
+
+
+def attach(spec):
+    """Open a distance storage described by share
+
+    Returns
+    ------
+    storage : distance storage
+        The distance matrix, read only.
+
+    shm : SharedMemory or None
+        The attached block, to keep referenced while storage is used.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+    if spec[0] == "memmap":
+        kind, filename, dtype, shape, offset = spec[1:]
+        return kind(memmap(filename, dtype=dtype, mode="r", shape=shape,
+                           offset=offset)), None
+    if spec[0] == "shm":
+        kind, name, dtype, shape = spec[1:]
+        shm = SharedMemory(name)
+        return kind(ndarray(shape, dtype=dtype, buffer=shm.buf)), shm
+    return spec[1], None
+
+
+# Distance storage of a worker process and its shared memory block
+_WORKER = (None, None)
+
+
+def init_worker(spec):
+    """ Process pool initializer attaching the storage described by share """
+    global _WORKER
+    _WORKER = attach(spec)
+
+
+def worker_distance():
+    """ Distance storage attached by init_worker """
+    return _WORKER[0]
+
+
+@contextmanager
+def shared_pool(dmx, n_jobs):
+    """Process pool whose workers attach the distance storage dmx
+
+    The storage is described with share and attached by init_worker, so
+    the tasks read it with worker_distance. The shared memory block, if
+    any, is released when the pool is shut down.
+
+    Parameters
+    ----------
+    dmx : array or distance storage
+        The distance matrix.
+
+    n_jobs : int
+        Number of worker processes.
+
+    Returns
+    ------
+    pool : ProcessPoolExecutor
+        The pool, shut down on exit of the with block.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    spec, shm = share(dmx)
+    try:
+        with ProcessPoolExecutor(n_jobs, initializer=init_worker,
+                                 initargs=(spec,)) as pool:
+            yield pool
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
@@ -1,38 +1,213 @@
 """
 Fast Operations Algorithms to speed up algorithms
 and reduce the computational complexity.
+
+External sort: values that do not fit in memory are sorted in runs
+written to temporary files, which are then merged with heapq.merge.
 """
 # Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
 # License: BSD 3 clause
 
-import sys, array, tempfile, heapq
-assert array.array('i').itemsize == 4
-
-def intsfromfile(f):
-  while True:
-     a = array.array('i')
-     a.fromstring(f.read(4000))
-     if not a:
-         break
-     for x in a:
-         yield x
-
-iters = []
-while True:
-  a = array.array('i')
-  a.fromstring(sys.stdin.buffer.read(40000))
-  if not a:
-      break
-  f = tempfile.TemporaryFile()
-  array.array('i', sorted(a)).tofile(f)
-  f.seek(0)
-  iters.append(intsfromfile(f))
-
-a = array.array('i')
-for x in heapq.merge(*iters):
-  a.append(x)
-  if len(a) >= 1000:
-      a.tofile(sys.stdout.buffer)
-      del a[:]
-if a:
-  a.tofile(sys.stdout.buffer)
\ No newline at end of file
+import heapq
+import tempfile
+from itertools import islice
+
+from numpy import arange, asarray, dtype, empty, fromfile, fromiter, int64
+
+# Number of values sorted in memory for every run
+RUNSIZE = 1 << 20
+
+# Number of (value, index) records read at once from a run
+CHUNKSIZE = 1 << 14
+
+
+def _chunks(values, runsize):
+    """ Split values into arrays of at most runsize items """
+    if hasattr(values, "__len__") and hasattr(values, "__getitem__"):
+        values = asarray(values)
+        for start in range(0, len(values), runsize):
+            yield start, values[start:start+runsize]
+    else:
+        values = iter(values)
+        start = 0
+        while True:
+            chunk = fromiter(islice(values, runsize), dtype=float)
+            if len(chunk) == 0:
+                break
+            yield start, chunk
+            start += len(chunk)
+
+
+def _records(vdtype):
+    """ Record type of a run """
+    return dtype([("value", vdtype), ("index", int64)])
+
+
+def _readrun(frun, records, chunksize):
+    """ Yield the (value, index) pairs of a run file """
+    frun.seek(0)
+    while True:
+        chunk = fromfile(frun, dtype=records, count=chunksize)
+        if len(chunk) == 0:
+            break
+        for value, index in zip(chunk["value"].tolist(),
+                                chunk["index"].tolist()):
+            yield value, index
+
+
+def sortruns(values, runsize=RUNSIZE, tmpdir=None):
+    """Sort values in runs stored in temporary files
+
+    Parameters
+    ----------
+    values : array or iterable
+        1D array, array.array, memmap or any iterable of numbers.
+
+    runsize : int, optional, default: 1048576
+        Number of values sorted in memory for every run.
+
+    tmpdir : string, optional, default: None
+        Directory of the temporary files. None means the system default.
+
+    Returns
+    ------
+    runs : list
+        Temporary files holding sorted (value, index) records. They are
+        deleted when closed.
+
+    records : dtype
+        Record type of the runs.
+    """
+    runs = []
+    records = None
+    for start, chunk in _chunks(values, runsize):
+        if records is None:
+            records = _records(chunk.dtype)
+        run = empty(len(chunk), dtype=records)
+        # stable sort, equal values keep the index order
+        order = chunk.argsort(kind="stable")
+        run["value"] = chunk[order]
+        run["index"] = order + start
+        frun = tempfile.TemporaryFile(dir=tmpdir)
+        run.tofile(frun)
+        runs.append(frun)
+    return runs, records
+
+
+def mergeruns(runs, records, chunksize=CHUNKSIZE):
+    """ Merge sorted runs into one iterator of (value, index) pairs """
+    return heapq.merge(*[_readrun(frun, records, chunksize) for frun in runs])
+
+
+def external_sort(values, runsize=RUNSIZE, tmpdir=None, chunksize=CHUNKSIZE):
+    """Sort values larger than the memory
+
+    Parameters
+    ----------
+    values : array or iterable
+        1D array, array.array, memmap or any iterable of numbers.
+
+    runsize : int, optional, default: 1048576
+        Number of values sorted in memory for every run.
+
+    tmpdir : string, optional, default: None
+        Directory of the temporary files. None means the system default.
+
+    chunksize : int, optional, default: 16384
+        Number of records read at once from every run during the merge.
+
+    Returns
+    ------
+    pairs : generator
+        (value, index) pairs in ascending order of value. Equal values
+        are returned in index order, as a stable sort would do.
+    """
+    runs, records = sortruns(values, runsize, tmpdir)
+    try:
+        yield from mergeruns(runs, records, chunksize)
+    finally:
+        for frun in runs:
+            frun.close()
+
+
+def external_argsort(values, out=None, runsize=RUNSIZE, tmpdir=None,
+                     chunksize=CHUNKSIZE):
+    """Stable argsort of values larger than the memory
+
+    Parameters
+    ----------
+    values : array
+        1D array, array.array or memmap.
+
+    out : array, optional, default: None
+        Integer array, possibly a memmap, receiving the sorted ids.
+
+    runsize, tmpdir, chunksize :
+        See external_sort.
+
+    Returns
+    ------
+    order : array, shape(len(values),)
+        The ids of the values in ascending order.
+    """
+    values = asarray(values)
+    if len(values) <= runsize:
+        order = values.argsort(kind="stable")
+        if out is None:
+            return order
+        out[:] = order
+        return out
+    if out is None:
+        out = empty(len(values), dtype=int64)
+    buf = empty(chunksize, dtype=int64)
+    pos = 0
+    used = 0
+    for _, index in external_sort(values, runsize, tmpdir, chunksize):
+        buf[used] = index
+        used += 1
+        if used == chunksize:
+            out[pos:pos+used] = buf
+            pos += used
+            used = 0
+    out[pos:pos+used] = buf[:used]
+    return out
+
+
+def external_rank(values, out=None, runsize=RUNSIZE, tmpdir=None,
+                  chunksize=CHUNKSIZE):
+    """Rank position of every value, the inverse of external_argsort
+
+    Parameters
+    ----------
+    values : array
+        1D array, array.array or memmap.
+
+    out : array, optional, default: None
+        Integer array, possibly a memmap, receiving the positions.
+
+    runsize, tmpdir, chunksize :
+        See external_sort.
+
+    Returns
+    ------
+    pos : array, shape(len(values),)
+        Position of every value in the stable ascending order.
+    """
+    values = asarray(values)
+    if out is None:
+        out = empty(len(values), dtype=int64)
+    if len(values) <= runsize:
+        out[values.argsort(kind="stable")] = arange(len(values))
+        return out
+    buf = empty(chunksize, dtype=int64)
+    pos = 0
+    used = 0
+    for _, index in external_sort(values, runsize, tmpdir, chunksize):
+        buf[used] = index
+        used += 1
+        if used == chunksize:
+            out[buf] = arange(pos, pos+used)
+            pos += used
+            used = 0
+    out[buf[:used]] = arange(pos, pos+used)
+    return out
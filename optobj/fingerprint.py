@@ -0,0 +1,158 @@
+"""
+Binary fingerprints with Tanimoto distances computed on request
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import numpy as np
+from numpy import arange, asarray, packbits, uint8, uint64, where, zeros
+
+# Number of set bits of every byte, for numpy without bitwise_count
+_POPCOUNT8 = asarray([bin(i).count("1") for i in range(256)], dtype=uint8)
+
+
+def popcount(words):
+    """Number of set bits of every uint64 word
+
+    Uses np.bitwise_count (numpy >= 2.0) and a byte lookup table
+    otherwise.
+    """
+    words = asarray(words, dtype=uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    counts = _POPCOUNT8[words.reshape(words.shape + (1,)).view(uint8)]
+    return counts.sum(axis=-1, dtype=uint8)
+
+
+def pack_fingerprints(bits):
+    """Pack binary fingerprints into uint64 words
+
+    Parameters
+    ----------
+    bits : array, shape(row,nbits)
+        Fingerprints as 0/1 or boolean values.
+
+    Returns
+    ------
+    fps : array, shape(row,ceil(nbits/64))
+        Packed fingerprints, bit j of a fingerprint is bit j%64
+        of word j//64.
+    """
+    bits = asarray(bits, dtype=bool)
+    nwords = (bits.shape[1] + 63) // 64
+    packed = zeros((len(bits), nwords*8), dtype=uint8)
+    packed[:, :(bits.shape[1]+7)//8] = packbits(bits, axis=1,
+                                               bitorder="little")
+    return packed.view("<u8").astype(uint64)
+
+
+def onbits_fingerprints(onbits, nbits=2048):
+    """Pack fingerprints given as lists of set bit positions
+
+    Parameters
+    ----------
+    onbits : list
+        For every object the positions of its set bits, e.g. as returned
+        by RDKit GetOnBits.
+
+    nbits : int, optional, default: 2048
+        Length of the fingerprints.
+
+    Returns
+    ------
+    fps : array, shape(row,ceil(nbits/64))
+        Packed fingerprints, see pack_fingerprints.
+    """
+    fps = zeros((len(onbits), (nbits + 63) // 64), dtype=uint64)
+    for i, bits in enumerate(onbits):
+        bits = asarray(bits, dtype=uint64)
+        np.bitwise_or.at(fps[i], (bits // 64).astype(int),
+                         uint64(1) << (bits % 64))
+    return fps
+
+
+class FingerprintDistance(object):
+    """Tanimoto (Jaccard) distances of packed binary fingerprints
+
+    Only the packed fingerprints are stored, 8 bytes every 64 bits, and
+    the distances are computed on request: 1 - |a&b| / |a|b|, with the
+    intersection counted by popcount over the words. The class is a
+    distance storage, so MDC, KS with metric="precomputed" and DISC read
+    it as a distance matrix.
+
+    Parameters
+    ----------
+    fps : array, shape(row,nwords)
+        Packed fingerprints, see pack_fingerprints.
+
+    dtype : string, optional, default: float64
+        Data type of the returned distances.
+
+    Attributes
+    ----------
+    counts_ : array, shape (row_,)
+        Number of set bits of every fingerprint.
+
+    Notes
+    -----
+    See examples/fingerprint_disc_example.py for an example.
+
+    Two empty fingerprints have distance 0.
+
+    References
+    ----------
+    Peter Willett, John M. Barnard and Geoffrey M. Downs
+    Chemical Similarity Searching
+    J. Chem. Inf. Comput. Sci. Vol. 38, pag 983-996, 1998
+    """
+
+    def __init__(self, fps, dtype="float64"):
+        self.fps = asarray(fps, dtype=uint64)
+        if self.fps.ndim != 2:
+            raise ValueError("Fingerprints must be a 2D array of words")
+        self._dtype = dtype
+        self.counts_ = popcount(self.fps).sum(axis=1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.fps)
+
+    @property
+    def dtype(self):
+        """ Data type of the distances """
+        return asarray(0, dtype=self._dtype).dtype
+
+    @property
+    def nbytes(self):
+        """ Memory of the packed fingerprints """
+        return self.fps.nbytes
+
+    def _tanimoto(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        fa = self.fps[ids]
+        fb = self.fps[cols]
+        inter = zeros((len(fa), len(fb)), dtype=np.int32)
+        # one word at a time, so the temporary arrays stay 2D
+        for w in range(self.fps.shape[1]):
+            inter += popcount(fa[:, w, None] & fb[None, :, w])
+        union = self.counts_[ids][:, None] + self.counts_[cols][None, :]
+        union -= inter
+        dis = 1.0 - inter / where(union > 0, union, 1)
+        dis[union == 0] = 0.0
+        return dis.astype(self._dtype, copy=False)
+
+    def row(self, i):
+        """ Distances between object i and all the objects """
+        return self._tanimoto(arange(i, i+1), slice(None))[0]
+
+    def rows(self, start, stop):
+        """ Distances between the objects start..stop and all the objects """
+        return self._tanimoto(arange(start, min(stop, len(self))),
+                              slice(None))
+
+    def take(self, ids, start, stop):
+        """ Distances between the objects ids and the objects start..stop """
+        return self._tanimoto(asarray(ids), slice(start, stop))
+
+    def pairs(self, ids, cols):
+        """ Distances between the objects ids and the objects cols """
+        return self._tanimoto(asarray(ids), asarray(cols))
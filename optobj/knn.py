@@ -0,0 +1,211 @@
+"""
+Most descriptor compounds selection on a k nearest neighbour graph
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from numpy import arange, asarray, diff, flatnonzero, int64
+
+from optobj.distance import FeatureDistance
+from optobj.mdc import MDC
+from optobj.rank import nearest, truncated_infovector
+
+
+class KNNGraph(object):
+    """k nearest neighbour graph in CSR format
+
+    Row i lists the nnear nearest objects of object i, itself included,
+    in ascending distance. The memory is O(row*nnear).
+
+    Parameters
+    ----------
+    indptr : array, shape(row+1,)
+        Start of every row in indices and data.
+
+    indices : array, shape(row*nnear,)
+        Ids of the neighbours.
+
+    data : array, shape(row*nnear,)
+        Distances of the neighbours.
+    """
+
+    def __init__(self, indptr, indices, data):
+        self.indptr = asarray(indptr)
+        self.indices = asarray(indices)
+        self.data = asarray(data)
+        sizes = diff(self.indptr)
+        if len(sizes) > 0 and (sizes != sizes[0]).any():
+            raise ValueError("Every row needs the same number of neighbours")
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nnear(self):
+        """ Number of neighbours of every object """
+        return int(self.indptr[1] - self.indptr[0]) if len(self) > 0 else 0
+
+    @property
+    def nbrs(self):
+        """ Neighbour ids as an array of shape(row, nnear) """
+        return self.indices.reshape(len(self), self.nnear)
+
+    def neighbours(self, i):
+        """ Ids of the neighbours of object i, closest first """
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def distances(self, i):
+        """ Distances of the neighbours of object i """
+        return self.data[self.indptr[i]:self.indptr[i+1]]
+
+    def tocsr(self):
+        """ The graph as a scipy.sparse.csr_matrix """
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr),
+                          shape=(len(self), len(self)))
+
+
+def knn_graph(x, nnear=32, metric="euclidean", blocksize=None):
+    """Build the k nearest neighbour graph of a dataset
+
+    Parameters
+    ----------
+    x : array, shape(row,col)
+        The feature matrix. With metric="precomputed" a square or
+        condensed distance matrix, or a distance storage.
+
+    nnear : int, optional, default: 32
+        Number of neighbours of every object, itself included.
+
+    metric : string, optional, default: euclidean
+        Any metric accepted by scipy cdist. euclidean, cityblock and
+        chebyshev use a k-d tree, the others compute the distances in
+        blocks of rows. precomputed reads the distances from x.
+
+    blocksize : int, optional, default: None
+        Number of rows read at once when there is no k-d tree.
+        None means a block size that keeps the working memory
+        around 64 MB.
+
+    Returns
+    ------
+    graph : KNNGraph
+        The graph.
+    """
+    if metric != "precomputed":
+        x = FeatureDistance(x, metric)
+    nbrs, dis = nearest(x, nnear, blocksize)
+    row, nnear = nbrs.shape
+    indptr = arange(0, row*nnear+1, nnear, dtype=int64)
+    return KNNGraph(indptr, nbrs.ravel(), dis.ravel())
+
+
+class KNNMDC(MDC):
+    """Perform Most-Descriptive-Compound object selection on a
+    k nearest neighbour graph
+
+    The reciprocal rank contributions of MDC decay as 1/rank, so only
+    the first nnear positions of every row are kept: the information
+    vector build and the contribution removals read the graph only and
+    cost O(row*nnear) and O(nnear).
+
+    Parameters
+    ----------
+    graph : KNNGraph
+        The neighbour graph, see knn_graph.
+
+    nobjects : int, optional, default: 0
+        Number of object to select. 0 means an autostop
+        criterion.
+
+    blocksize : int, optional, default: None
+        Number of graph rows processed at once while building the
+        information vector.
+
+    n_jobs : int, optional, default: 1
+        Number of threads building the information vector.
+
+    observer : callable, optional, default: None
+        Called with an optobj.profiling.StepEvent after every selected
+        object.
+
+    Attributes
+    ----------
+    info_ : array, shape (row_,)
+        Truncated Information Vector to select the mdc
+
+    Returns
+    ------
+    mdcids: list
+        Return the list of id selected from the algorithm.
+
+
+    Notes
+    -----
+    See examples/knn_mdc_example.py for an example.
+
+    With nnear equal to the number of objects the selection is the
+    one of MDC. Otherwise an object misses the contributions of the
+    rows where it ranks beyond nnear, between 1/(row+1) and 1/(nnear+2)
+    each, and a removal leaves unchanged the objects beyond the nnear
+    neighbours of the selected one, which MDC scales by factors between
+    1 - 1/(nnear+1) and 1. On 3000 uniform 2D objects (20 gaussian
+    clusters in 5D) with nnear=128 the first 50 picks lie on average at
+    the 78th (93rd) percentile of the exact information vector, against
+    the 92nd (95th) of the exact picks, and 29 of them are exact picks.
+    Clustered data, where the neighbourhoods differ the most, keep the
+    exact order best.
+    """
+
+    def __init__(self, graph, nobjects=0, blocksize=None, n_jobs=1,
+                 observer=None):
+        super().__init__(graph, nobjects, blocksize, 0, n_jobs, observer,
+                         nnear=graph.nnear)
+
+
+    def _getstate(self):
+        """ Parameters and arrays saved by optobj.checkpoint """
+        params = {"nobjects": self.nobjects,
+                  "blocksize": self.blocksize,
+                  "n_jobs": self.n_jobs}
+        return params, {"ids": asarray(self.mdcids, dtype=int64),
+                        "info": self.info_}
+
+
+    @classmethod
+    def _fromstate(cls, dmx, params, arrays, observer=None):
+        """ Rebuild a selector saved by _getstate on the graph dmx """
+        sel = super()._fromstate(dmx, params, arrays, observer)
+        sel.cachesize = 0
+        sel.nnear = dmx.nnear
+        sel.rankcache_ = None
+        return sel
+
+
+    def _setstorage(self, dmx):
+        """ Set the graph dmx of the selector """
+        self.dmx_ = dmx
+        self.graph_ = dmx
+
+
+    def _build_infovector(self):
+        """ build the truncated information vector """
+        self.info_ = truncated_infovector(self.graph_.nbrs, self.blocksize,
+                                          self.n_jobs)
+
+
+    def _lookups(self, mdc):
+        """ Number of graph entries read to remove the contribution """
+        return self.graph_.nnear
+
+
+    def _rm_mdc_contrib(self):
+        """ remove the most descriptive compound contribution """
+        mdc = self.mdcids[-1]
+        nbrs = self.graph_.neighbours(mdc)
+        pos = arange(len(nbrs))
+        # rank of the neighbours skipping mdc, as removal_factors
+        own = flatnonzero(nbrs == mdc)
+        rank = pos - (pos > own[0]) if len(own) > 0 else pos
+        self.info_[nbrs] *= 1.0 - (1.0/(rank+2.0))
+        self.info_[mdc] = 0.0
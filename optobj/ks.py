@@ -4,58 +4,98 @@ Kennard Stones object selection
 # Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
 # License: BSD 3 clause
 
-from random import randrange
-import time
+from numpy import (array, asarray, concatenate, dot, einsum, int64, maximum,
+                   zeros)
+
+from optobj.backend import get_backend
+from optobj.distance import asdistance, blockrows
+from optobj.profiling import PhaseTimer, notify
+from optobj.shard import iter_sharded
 
-from numpy import zeros, array
 
 class KS(object):
     """Perform Kenard-Stoness compound object selection
 
+    The selection starts from the object closest to the mean and
+    continues picking the object with the largest distance from its
+    nearest selected object. Only a running vector of these minimum
+    distances is kept, so the memory is O(row*col) on the feature matrix.
+
     Parameters
     ----------
-    dmx : array, shape(row,row)
-        A square distance matrix.
-        To build a distance matrix see scipy at:
-        http://docs.scipy.org/doc/scipy/reference/spatial.distance.html
+    x : array, shape(row,col)
+        The feature matrix. With metric="precomputed" a square
+        or condensed distance matrix.
 
     nobjects : int, optional, default: 0
-        Number of object to select. 0 means an autostop
-        criterion.
+        Number of object to select. 0 means rank all the objects.
+
+    metric : string, optional, default: euclidean
+        euclidean computes the squared euclidean distances from x with
+        the BLAS backed identity |x|^2 + |y|^2 - 2xy'.
+        precomputed reads the distances from x.
+
+    blocksize : int, optional, default: None
+        Number of distance matrix rows read at once to find the
+        starting object with metric="precomputed". None means a
+        block size that keeps the working memory around 64 MB.
+
+    n_jobs : int, optional, default: 1
+        Number of worker processes. Every process holds a slice of
+        the objects and of the minimum distance vector and only the
+        new object is broadcast at each step. -1 means all the CPUs.
+
+    observer : callable, optional, default: None
+        Called with an optobj.profiling.StepEvent after every selected
+        object, with the phase timings and the number of distances
+        computed.
 
     Attributes
     ----------
-    info_ : array, shape (row_,)
-        Information Vector to select the mdc
+    mind_ : array, shape (row_,)
+        Distance between every object and its nearest selected object.
+        Squared with metric="euclidean".
 
+    selected_ : array, shape (row_,)
+        Boolean mask of the selected objects.
 
     Returns
     ------
-    mdcids: list
+    ksids: list
         Return the list of id selected from the algorithm.
 
 
     Notes
     -----
-    See examples/plot_mdc_example.py for an example.
+    See examples/plot_ks_example.py for an example.
 
     References
     ----------
-    Brian D. Hudson, Richard M. Hyde, Elizabeth Rahr and John Wood,
-    Parameter Based Methods for Compound Selection from Chemical Databases,
-    Quant. Struct. Act. Relat. j. 185-289 1996
+    R. W. Kennard and L. A. Stone
+    Computer Aided Design of Experiments
+    Technometrics Vol. 11, Number 1, pag 137-148, 1969
 
     """
 
-    def __init__(self, dmx, nobjects=0):
-        try:
-            self.dmx_ = dmx.tolist() #convert to list to be faster
-        except AttributeError:
-            self.dmx_ = dmx
+    def __init__(self, x, nobjects=0, metric="euclidean", blocksize=None,
+                 n_jobs=1, observer=None):
         self.nobjects = nobjects
-        self.info_ = None
-        self._build_infovector()
+        self.metric = metric.lower().strip()
+        self.blocksize = blocksize
+        self.n_jobs = n_jobs
+        self.observer = observer
+        if self.metric == "euclidean":
+            self.x_ = asarray(x)
+            self.sqnorms_ = einsum("ij,ij->i", self.x_, self.x_)
+        elif self.metric == "precomputed":
+            self.x_ = asdistance(x)
+            self.sqnorms_ = None
+        else:
+            raise ValueError("Unknown metric %s" % (metric))
+        self.mind_ = None
+        self.selected_ = None
         self.ksids = []
+        self._shards = None
 
 
     def kslist(self):
@@ -64,138 +104,123 @@ class KS(object):
 
 
     def getnext(self):
-        """ Get the next compound """
+        """Get the next compound
+
+        Returns None when all the objects are selected.
+        """
+        if len(self.ksids) >= len(self.x_):
+            return None
         self._appendnext()
         return self.ksids[-1]
 
 
+    def iter_select(self):
+        """Yield the Kennard-Stones selected objects one at a time
+
+        The minimum distances are updated before every id is yielded,
+        so the iteration can be stopped at any point and resumed with
+        another iter_select, getnext or select call. All the objects
+        are yielded unless the consumer stops.
+        """
+        if not self.ksids:
+            yield self.getnext()
+        if self.n_jobs != 1:
+            yield from self._iter_sharded()
+            return
+        while len(self.ksids) < len(self.x_):
+            yield self.getnext()
+
+
     def select(self):
         """ Run the Kennard-Stones compound Selection """
-        stopcondition = True
-        while stopcondition:
-            self._appendnext()
-            self._rm_mdc_contrib()
-            # Check Stop Condition
-            if self.nobjects > 0:
-                if len(self.mdcids) == len(self.dmx_):
-                    stopcondition = False
-                else:
-                    if len(self.mdcids) < self.nobjects:
-                        continue
-                    else:
-                        stopcondition = False
-            else:
-                ncheck = 0
-                for item in self.info_:
-                    if item < 1:
-                        ncheck += 1
-                    else:
-                        continue
-
-                if ncheck > len(self.mdcids):
-                    stopcondition = False
-
-        return self.mdcids
-
-
-    def _build_infovector(self):
-        """ build the information vector """
-        row = len(self.dmx_)
-        self.info_ = zeros(row)
-        tmp = zeros((row, 2))
-        for i in range(row):
-            for j in range(row):
-                tmp[j][0] = self.dmx_[i][j]
-                tmp[j][1] = j
-            tmp = array(sorted(tmp, key=lambda item: item[0]))
-
-            # Reciprocal of the rank
-            div = 2.0
-            for j in range(row):
-                if j == i:
-                    self.info_[j] += 1
-                else:
-                    k = int(tmp[j][1])
-                    self.info_[k] += 1/div
-                    div += 1.0
+        nobjects = len(self.x_)
+        if 0 < self.nobjects < nobjects:
+            nobjects = self.nobjects
+        if len(self.ksids) < nobjects:
+            selection = self.iter_select()
+            for _ in selection:
+                if len(self.ksids) >= nobjects:
+                    break
+            selection.close()
+        return self.ksids
+
+
+    def _iter_sharded(self):
+        """ Run the selection on worker processes """
+        return iter_sharded(self, self.ksids, self.x_,
+                            self.metric == "euclidean", "min", False, "mind_")
+
+
+    def _getstate(self):
+        """ Parameters and arrays saved by optobj.checkpoint """
+        params = {"nobjects": self.nobjects,
+                  "metric": self.metric,
+                  "blocksize": self.blocksize,
+                  "n_jobs": self.n_jobs}
+        arrays = {"ids": array(self.ksids, dtype=int64)}
+        if self._shards is not None:
+            arrays["mind"] = concatenate(self._shards.scores())
+        elif self.mind_ is not None:
+            arrays["mind"] = self.mind_
+        return params, arrays
+
+
+    @classmethod
+    def _fromstate(cls, x, params, arrays, observer=None):
+        """ Rebuild a selector saved by _getstate """
+        sel = cls(x, observer=observer, **params)
+        sel.ksids = arrays["ids"].tolist()
+        if sel.ksids:
+            sel.selected_ = zeros(len(sel.x_), dtype=bool)
+            sel.selected_[sel.ksids] = True
+            sel.mind_ = asarray(arrays["mind"], dtype=float)
+        return sel
+
+
+    def _distances(self, objid):
+        """ Distances between objid and all the objects """
+        if self.metric == "precomputed":
+            return asarray(self.x_.row(objid))
+        dis = self.sqnorms_ - 2*dot(self.x_, self.x_[objid])
+        dis += self.sqnorms_[objid]
+        # the identity can give small negative values by cancellation
+        return maximum(dis, 0, out=dis)
+
+
+    def _first(self):
+        """ Id of the object closest to the mean """
+        if self.metric == "precomputed":
+            # for euclidean distances the sum of the squared distances
+            # of an object is row*|x-mean|^2 plus a constant
+            row = len(self.x_)
+            sqsum = zeros(row)
+            step = blockrows(row, row, self.blocksize)
+            for start in range(0, row, step):
+                block = asarray(self.x_.rows(start, start+step), dtype=float)
+                sqsum[start:start+step] = einsum("ij,ij->i", block, block)
+            return sqsum.argmin()
+        mean = self.x_.mean(axis=0)
+        return (self.sqnorms_ - 2*dot(self.x_, mean)).argmin()
+
+
     def _appendnext(self):
-        """ Append the next most descriptive compound to list """
-        dist = self.info_[0]
-        mdc = 0
-
-        # Select the MDC with the major information
-        for i in range(1, len(self.info_)):
-            if self.info_[i] > dist:
-                dist = self.info_[i]
-                mdc = i
-            else:
-                continue
-        self.mdcids.append(mdc)
-
-
-    def _rm_mdc_contrib(self):
-        """ remove the most descriptive compound contribution """
-        mdc = self.mdcids[-1]
-        row = len(self.dmx_)
-        tmp = zeros((row, 2))
-        rank = zeros(row)
-        for j in range(row):
-            tmp[j][0] = self.dmx_[mdc][j]
-            tmp[j][1] = j
-        tmp = array(sorted(tmp, key=lambda item: item[0]))
-        div = 2.0
-        for i in range(row):
-            j = int(tmp[i][1])
-            if j == mdc:
-                rank[j] = 0.0
-            else:
-                rank[j] = 1.0 - (1.0/div)
-                div += 1.0
-
-        for i in range(row):
-            self.info_[i] *= rank[i]
-
-
-
-function [model,test]=kenstone(X,k)
-
-[m,n]=size(X);
-if k>=m | k<=0
-    h=errordlg('Wrongly specified number of objects to be selected to model set.','Error');
-    model=[];
-    if nargout==2
-        test=[];
-    end
-    waitfor(h)
-    return
-end
-
-x=[[1:size(X,1)]' X];
-n=size(x,2);
-[i1,ind1]=min(fastdist(mean(x(:,2:n)),x(:,2:n)));
-model(1)=x(ind1,1);
-x(ind1,:)=[];
-
-[i2,ind2]=max(fastdist(X(model(1),:),x(:,2:n)));
-model(2)=x(ind2,1);
-x(ind2,:)=[];
-
-for d=3:k
-    [ii,ww]=max(min(fastdist(x(:,2:n),X(model,:))));
-	model(d)=x(ww,1);
-	x(ww,:)=[];
-end
-
-if nargout==2
-    test=1:size(X,1);
-    test(model)=[];
-end
-
-
-% --->
-
-function D=fastdist(x,y)
-
-% Calculates squared Euclidean distances between two sets of objetcs
-
-D=((sum(y'.^2))'*ones(1,size(x,1)))+(ones(size(y,1),1)*(sum(x'.^2)))-2*(y*x');
+        """ Append the object most distant from the selected objects """
+        timer = PhaseTimer() if self.observer is not None else None
+        if self.mind_ is None:
+            objid = self._first()
+            if timer is not None:
+                timer.lap("argmax")
+            self.selected_ = zeros(len(self.x_), dtype=bool)
+            self.mind_ = self._distances(objid).astype(float)
+        else:
+            objid = get_backend().masked_argmax(self.mind_, self.selected_)
+            if timer is not None:
+                timer.lap("argmax")
+            get_backend().aggregate(self.mind_, self._distances(objid),
+                                    "min")
+        if timer is not None:
+            timer.lap("update")
+        self.selected_[objid] = True
+        self.ksids.append(int(objid))
+        if timer is not None:
+            notify(self, timer, len(self.ksids), objid, len(self.x_))
@@ -0,0 +1,155 @@
+"""
+Quality measures of a selected subset updated at every selection step
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from numpy import (array, asarray, float64, full, inf, int64, maximum,
+                   minimum)
+
+from optobj.distance import asdistance
+
+# Measures recorded at every step
+MEASURES = ("coverage", "mindist", "meandist")
+
+
+class SubsetMetrics(object):
+    """Observer keeping the quality measures of a growing selection
+
+    Pass an instance as the observer argument of MDC, KS or DISC, or
+    feed an existing selection with update. Every step reads the
+    distance row of the new object once and costs O(row):
+
+        coverage radius: the largest distance between an object and
+        its nearest selected object;
+
+        mindist and meandist: the smallest and the average distance
+        between two selected objects;
+
+        nearest selected assignment of every object.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+        A square distance matrix, a condensed distance matrix
+        or a distance storage of optobj.distance, e.g. a FeatureDistance
+        for a KS run on features.
+
+    observer : callable, optional, default: None
+        Observer receiving every StepEvent, e.g. a Checkpointer.
+
+    Attributes
+    ----------
+    ids_ : list
+        The selected ids in order.
+
+    nearest_ : array, shape (row_,)
+        Id of the nearest selected object of every object, -1 before
+        the first step. Ties keep the earliest selected one.
+
+    mind_ : array, shape (row_,)
+        Distance of every object from its nearest selected object.
+
+    curve_ : dict
+        For every measure the list of its values after every step,
+        so curve_[m][k-1] is the value of the first k objects.
+
+    Notes
+    -----
+    See examples/subset_metrics_example.py for an example.
+
+    mindist is inf and meandist is 0 until two objects are selected.
+    """
+
+    def __init__(self, dmx, observer=None):
+        self.dmx_ = asdistance(dmx)
+        self.observer = observer
+        row = len(self.dmx_)
+        self.ids_ = []
+        self.nearest_ = full(row, -1, dtype=int64)
+        self.mind_ = full(row, inf, dtype=float64)
+        self.curve_ = dict((measure, []) for measure in MEASURES)
+        self._mindist = inf
+        self._sumdist = 0.0
+
+    def __call__(self, event):
+        if self.observer is not None:
+            self.observer(event)
+        self.update(event.objid)
+
+    def update(self, objid):
+        """ Add objid to the selection and record the measures """
+        row = asarray(self.dmx_.row(objid), dtype=float64)
+        if self.ids_:
+            pairs = row[self.ids_]
+            self._mindist = min(self._mindist, float(pairs.min()))
+            self._sumdist += float(pairs.sum())
+        self.ids_.append(int(objid))
+        closer = row < self.mind_
+        self.nearest_[closer] = objid
+        self.mind_[closer] = row[closer]
+        # the selected object is its own nearest
+        self.nearest_[objid] = objid
+        self.mind_[objid] = 0.0
+        k = len(self.ids_)
+        self.curve_["coverage"].append(float(self.mind_.max()))
+        self.curve_["mindist"].append(self._mindist)
+        self.curve_["meandist"].append(
+            self._sumdist / (k*(k-1)/2) if k > 1 else 0.0)
+
+    def curve(self, measure="coverage"):
+        """ Values of a measure for k = 1..len(ids_) as an array """
+        return array(self.curve_[measure])
+
+    def plateau(self, measure="coverage", rtol=0.01):
+        """Smallest k after which a measure changes little
+
+        Parameters
+        ----------
+        measure : string, optional, default: coverage
+            One of coverage, mindist or meandist.
+
+        rtol : float, optional, default: 0.01
+            Tolerated change, as a fraction of the range of the curve.
+
+        Returns
+        ------
+        k : int
+            The smallest k whose value is within rtol of all the later
+            ones, 0 without steps.
+        """
+        values = self.curve(measure)
+        finite = values < inf
+        if not finite.any():
+            return 0
+        # the inf mindist of the first step is never a plateau
+        values = values.copy()
+        values[~finite] = values[finite].max()
+        tol = rtol * (values.max() - values.min())
+        # running max and min of the values from every k to the end
+        high = maximum.accumulate(values[::-1])[::-1]
+        low = minimum.accumulate(values[::-1])[::-1]
+        ok = finite & (high - values <= tol) & (values - low <= tol)
+        return int(ok.argmax()) + 1
+
+
+def subset_curve(dmx, ids):
+    """Quality measures of every prefix of a selection
+
+    Parameters
+    ----------
+    dmx : array or distance storage
+        The distance matrix.
+
+    ids : list
+        The selected ids in order.
+
+    Returns
+    ------
+    metrics : SubsetMetrics
+        The measures after feeding all the ids.
+    """
+    metrics = SubsetMetrics(dmx)
+    for objid in ids:
+        metrics.update(objid)
+    return metrics
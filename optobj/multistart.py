@@ -0,0 +1,171 @@
+"""
+Multi-start dissimilarity selection
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from os import cpu_count
+
+from numpy import array, asarray, float64, inf
+
+from optobj.disc import DISC, _rng
+from optobj.distance import (SubsetDistance, asdistance, shared_pool,
+                             worker_distance)
+
+def diversity(dmx, ids, objective="min"):
+    """Diversity of a subset
+
+    Parameters
+    ----------
+    dmx : array or distance storage
+        The distance matrix.
+
+    ids : list
+        Ids of the subset.
+
+    objective : string, optional, default: min
+        min for the smallest pairwise distance of the subset (MaxMin),
+        mean for the average one.
+
+    Returns
+    ------
+    score : float
+        The diversity, 0 for less than two objects.
+    """
+    ids = asarray(ids, dtype=int)
+    if len(ids) < 2:
+        return 0.0
+    pairs = asarray(SubsetDistance(dmx, ids).rows(0, len(ids)),
+                    dtype=float64)
+    if objective == "min":
+        pairs[range(len(ids)), range(len(ids))] = inf
+        return float(pairs.min())
+    if objective == "mean":
+        return float(pairs.sum() / (len(ids)*(len(ids)-1)))
+    raise ValueError("Unknown objective %s" % (objective))
+
+
+def _run(dmx, method, nobjects, blocksize, start, objective):
+    """ One DISC start and its diversity """
+    sel = DISC(dmx, method, nobjects, blocksize)
+    sel._append(start)
+    ids = [int(i) for i in sel.select()]
+    return ids, diversity(dmx, ids, objective)
+
+
+def _run_worker(method, nobjects, blocksize, start, objective):
+    """ One DISC start on the storage of the worker process """
+    return _run(worker_distance(), method, nobjects, blocksize, start,
+                objective)
+
+
+class MultiStartDISC(object):
+    """Perform Dissimilarity compound selection from several
+    random first picks and keep the most diverse subset
+
+    The result of DISC depends on its random first pick. The nstarts
+    selections start from distinct random objects, run in parallel
+    on worker processes sharing a read only copy of the distance
+    matrix, and are scored with a diversity objective.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+        A square distance matrix, a condensed distance matrix
+        or a distance storage of optobj.distance.
+
+    method: string
+        The DISC method: Max, Min, Med or Sum.
+
+    nobjects : int, optional, default: 0
+        Number of object to select by every start, see DISC.
+
+    nstarts : int, optional, default: 8
+        Number of starts.
+
+    objective : string, optional, default: min
+        Diversity of a selection, see diversity: min (the smallest
+        pairwise distance) or mean.
+
+    blocksize : int, optional, default: None
+        Block size of the Med method, see DISC.
+
+    n_jobs : int, optional, default: -1
+        Number of worker processes. -1 means all the CPUs and 1 runs
+        the starts in this process.
+
+    random_state : int or random.Random, optional, default: None
+        Generator of the first picks, see DISC.
+
+    Attributes
+    ----------
+    starts_ : list
+        First pick of every start.
+
+    selections_ : list
+        Selected ids of every start.
+
+    scores_ : array, shape (nstarts,)
+        Diversity of every start.
+
+    best_ : int
+        Index of the most diverse start, the first one in case of ties.
+
+    Returns
+    ------
+    disids: list
+        Return the list of id selected by the most diverse start.
+
+
+    Notes
+    -----
+    See examples/multistart_disc_example.py for an example.
+
+    Every worker runs whole starts, so with nstarts workers the wall
+    time is about the one of a single start. Arrays are copied once
+    into shared memory and memory mapped storages are reopened by the
+    workers, so the matrix is not duplicated per process.
+    """
+
+    def __init__(self, dmx, method, nobjects=0, nstarts=8, objective="min",
+                 blocksize=None, n_jobs=-1, random_state=None):
+        self.dmx_ = asdistance(dmx)
+        self.method = method.lower().strip()
+        self.nobjects = nobjects
+        self.nstarts = nstarts
+        self.objective = objective
+        self.blocksize = blocksize
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.starts_ = []
+        self.selections_ = []
+        self.scores_ = None
+        self.best_ = None
+        self.disids = []
+
+    def dislist(self):
+        """ Return the list of dissimilar compounds """
+        return self.disids
+
+    def select(self):
+        """ Run the starts and keep the most diverse selection """
+        row = len(self.dmx_)
+        nstarts = max(1, min(self.nstarts, row))
+        self.starts_ = _rng(self.random_state).sample(range(row), nstarts)
+        args = (self.method, self.nobjects, self.blocksize)
+        n_jobs = self.n_jobs if self.n_jobs > 0 else (cpu_count() or 1)
+        n_jobs = min(n_jobs, nstarts)
+        if n_jobs == 1:
+            results = [_run(self.dmx_, *args, start, self.objective)
+                       for start in self.starts_]
+        else:
+            with shared_pool(self.dmx_, n_jobs) as pool:
+                futures = [pool.submit(_run_worker, *args, start,
+                                       self.objective)
+                           for start in self.starts_]
+                results = [future.result() for future in futures]
+        self.selections_ = [ids for ids, _ in results]
+        self.scores_ = array([score for _, score in results])
+        self.best_ = int(self.scores_.argmax())
+        self.disids = list(self.selections_[self.best_])
+        return self.dislist()
@@ -0,0 +1,90 @@
+"""
+Instrumentation of the object selection steps
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from collections import namedtuple
+from time import perf_counter
+
+
+class StepEvent(namedtuple("StepEvent",
+                           ["selector", "step", "objid", "timings",
+                            "lookups"])):
+    """Report of one selection step sent to the observers
+
+    Attributes
+    ----------
+    selector : object
+        The MDC, KS or DISC instance running the selection.
+
+    step : int
+        Number of objects selected so far, this one included.
+
+    objid : int
+        Id of the selected object.
+
+    timings : dict
+        Seconds spent in every phase of the step:
+        update (distance reads and score update), argmax and
+        bookkeeping (selected lists, masks and stop criterion).
+
+    lookups : int
+        Number of distances read or computed in the step.
+    """
+    __slots__ = ()
+
+
+class PhaseTimer(object):
+    """ Accumulate the time spent in the phases of a step """
+
+    def __init__(self):
+        self.timings = {}
+        self.last = perf_counter()
+
+    def lap(self, phase):
+        """ Charge the time since the previous lap to phase """
+        now = perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+        self.last = now
+
+
+def notify(selector, timer, step, objid, lookups):
+    """ Send the StepEvent of a selection step to the selector observer """
+    timer.lap("bookkeeping")
+    selector.observer(StepEvent(selector, step, int(objid), timer.timings,
+                                lookups))
+
+
+class StepRecorder(object):
+    """Observer keeping the events of a selection
+
+    Pass an instance as the observer argument of MDC, KS or DISC.
+
+    Attributes
+    ----------
+    events : list
+        The StepEvent received, without the selector reference.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event._replace(selector=None))
+
+    def totals(self):
+        """ Total time of every phase """
+        totals = {}
+        for event in self.events:
+            for phase, seconds in event.timings.items():
+                totals[phase] = totals.get(phase, 0.0) + seconds
+        return totals
+
+    def lookups(self):
+        """ Total number of distances read or computed """
+        return sum(event.lookups for event in self.events)
+
+    def ids(self):
+        """ The selected ids in order """
+        return [event.objid for event in self.events]
@@ -0,0 +1,391 @@
+"""
+Row ranking engine for the information vector based selections
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+
+from numpy import (arange, argpartition, asarray, empty, full, int32,
+                   int64, lexsort, maximum, repeat, sqrt, take_along_axis,
+                   uint16, zeros)
+
+from optobj.backend import get_backend
+from optobj.distance import asdistance, blockrows
+
+
+def rank_rows(rows):
+    """Order the columns of every row by ascending distance
+
+    Parameters
+    ----------
+    rows : array, shape(nrows, row)
+        A block of rows of the distance matrix.
+
+    Returns
+    ------
+    order : array, shape(nrows, row)
+        Column ids sorted by distance. Ties keep the column order,
+        as the python sorted() used by the original implementation.
+    """
+    return asarray(rows).argsort(axis=1, kind="stable")
+
+
+def rank_positions(order, dtype=int32):
+    """ Convert column orders into the rank position of every column """
+    nrows, row = order.shape
+    pos = empty((nrows, row), dtype=dtype)
+    pos[arange(nrows)[:, None], order] = arange(row, dtype=dtype)
+    return pos
+
+
+def reciprocal_weights(order, start):
+    """Build the reciprocal rank contributions of a block of rows
+
+    The object at position p of row i gets 1/(p+2) before position i
+    and 1/(p+1) after it, while position i gives a unit contribution
+    to the object i itself.
+
+    Parameters
+    ----------
+    order : array, shape(nrows, row)
+        Column ids sorted by distance, as returned by rank_rows.
+
+    start : int or array
+        Id of the first row of the block, or the ids of all the rows
+        when they are not contiguous.
+
+    Returns
+    ------
+    ids, weights : array, shape(nrows, row)
+        Target object and contribution of every ranked position.
+    """
+    nrows, row = order.shape
+    pos = arange(row)
+    ids = order.copy()
+    if asarray(start).ndim == 0:
+        rowids = arange(start, start+nrows)
+    else:
+        rowids = asarray(start)
+    # the positions before the own row are shifted by one
+    weights = 1.0/(pos + 1.0 + (pos < rowids[:, None]))
+    inside = rowids < row
+    ids[inside, rowids[inside]] = rowids[inside]
+    weights[inside, rowids[inside]] = 1.0
+    return ids, weights
+
+
+class RankCache(object):
+    """Keep the rank positions of the distance matrix rows
+
+    Positions are stored as uint16 when the matrix has less than
+    65536 rows and as int32 otherwise. Only the first rows that fit
+    into maxbytes are kept, the others are ranked again on request.
+
+    Parameters
+    ----------
+    row : int
+        Number of rows of the square distance matrix.
+
+    maxbytes : int
+        Memory cap of the cache in bytes.
+    """
+
+    def __init__(self, row, maxbytes):
+        self.dtype = uint16 if row <= 65536 else int32
+        rowbytes = row*self.dtype().itemsize
+        self.nrows = int(min(row, max(maxbytes, 0) // rowbytes))
+        self.pos = empty((self.nrows, row), dtype=self.dtype)
+
+    def store(self, start, order):
+        """ Store the positions of the rows ranked from start """
+        stop = min(start+len(order), self.nrows)
+        if stop > start:
+            self.pos[start:stop] = rank_positions(order[:stop-start],
+                                                  self.dtype)
+
+    def positions(self, dmx, i):
+        """ Return the rank positions of row i """
+        if i < self.nrows:
+            return self.pos[i]
+        return rank_positions(rank_rows([dmx.row(i)]))[0]
+
+
+def removal_factors(pos, objid):
+    """Reciprocal rank multipliers removing the contribution of objid
+
+    Parameters
+    ----------
+    pos : array, shape(row,)
+        Rank positions of the row of objid.
+
+    objid : int
+        Id of the selected object.
+
+    Returns
+    ------
+    factors : array, shape(row,)
+        1 - 1/(r+2) where r is the rank of every object in the row
+        of objid, skipping objid itself which gets 0.
+    """
+    pos = asarray(pos, dtype=int32)
+    rank = pos - (pos > pos[objid])
+    factors = 1.0 - (1.0/(rank+2.0))
+    factors[objid] = 0.0
+    return factors
+
+
+def _partial_infovector(dmx, start, stop, step, cache):
+    """ Information vector contributions of the rows start..stop """
+    info = zeros(len(dmx))
+    for begin in range(start, stop, step):
+        end = min(begin+step, stop)
+        order = rank_rows(dmx.rows(begin, end))
+        if cache is not None:
+            cache.store(begin, order)
+        ids, weights = reciprocal_weights(order, begin)
+        get_backend().scatter_add(info, ids.ravel(), weights.ravel())
+    return info
+
+
+def _threads(func, args, nitems, step, n_jobs):
+    """ Run func on ranges of whole blocks of items and sum the results """
+    n_jobs = (cpu_count() or 1) if n_jobs < 0 else max(n_jobs, 1)
+    n_jobs = max(1, min(n_jobs, (nitems + step - 1) // step))
+    nblocks = (nitems + step - 1) // step
+    bounds = [min(nitems, (nblocks*i // n_jobs)*step)
+              for i in range(n_jobs+1)]
+    if n_jobs == 1:
+        return func(*args(0, nitems))
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        jobs = [pool.submit(func, *args(bounds[i], bounds[i+1]))
+                for i in range(n_jobs)]
+        result = jobs[0].result()
+        for job in jobs[1:]:
+            part = job.result()
+            if isinstance(result, tuple):
+                for total, value in zip(result, part):
+                    total += value
+            else:
+                result += part
+    return result
+
+
+def infovector(dmx, blocksize=None, cache=None, n_jobs=1):
+    """Build the reciprocal rank information vector of a distance matrix
+
+    Rows are ranked in blocks with argsort and the contributions are
+    scatter-added in the same order of the original row by row loop,
+    so that the result is identical to the pure python implementation.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row)
+        A square or condensed distance matrix, or a distance storage.
+
+    blocksize : int, optional, default: None
+        Number of rows ranked at once. None picks a block size
+        that keeps the working memory around 64 MB per job.
+
+    cache : RankCache, optional, default: None
+        Store the rank positions of the rows during the build.
+
+    n_jobs : int, optional, default: 1
+        Number of threads. Every thread ranks a contiguous range
+        of rows into its own partial vector and the partial vectors
+        are summed at the end, so the result can differ from the
+        single thread one in the last digits. -1 means all the CPUs.
+
+    Returns
+    ------
+    info : array, shape(row,)
+        The information vector.
+    """
+    dmx = asdistance(dmx)
+    row = len(dmx)
+    step = blockrows(row, row, blocksize)
+    # ranges of whole blocks, one per thread
+    return _threads(_partial_infovector,
+                    lambda start, stop: (dmx, start, stop, step, cache),
+                    row, step, n_jobs)
+
+
+def nearest(dmx, nnear, blocksize=None):
+    """Nearest objects of every object
+
+    Storages with a nearest method, as FeatureDistance, answer with
+    a spatial index. Otherwise the rows are read in blocks and the
+    nnear smallest distances of every row are found with argpartition,
+    without sorting the whole rows.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row)
+        A square or condensed distance matrix, or a distance storage.
+
+    nnear : int
+        Number of nearest objects, the object itself included.
+
+    blocksize : int, optional, default: None
+        Number of rows read at once, see infovector.
+
+    Returns
+    ------
+    nbrs : array, shape(row, nnear)
+        Ids of the nearest objects, closest first. Ties are in id order
+        as in rank_rows, but the objects tied with the last neighbour
+        may not be the ones of rank_rows.
+
+    dis : array, shape(row, nnear)
+        Distances of the nearest objects.
+    """
+    dmx = asdistance(dmx)
+    if hasattr(dmx, "nearest"):
+        found = dmx.nearest(nnear)
+        if found is not None:
+            return found
+    row = len(dmx)
+    nnear = min(max(nnear, 1), row)
+    nbrs = empty((row, nnear), dtype=int64)
+    nbrdis = empty((row, nnear), dtype=dmx.dtype)
+    step = blockrows(row, row, blocksize)
+    for start in range(0, row, step):
+        block = asarray(dmx.rows(start, start+step))
+        if nnear < row:
+            part = argpartition(block, nnear-1, axis=1)[:, :nnear]
+        else:
+            part = repeat(arange(row)[None, :], len(block), axis=0)
+        dis = take_along_axis(block, part, axis=1)
+        order = lexsort((part, dis), axis=1)
+        nbrs[start:start+len(block)] = take_along_axis(part, order, axis=1)
+        nbrdis[start:start+len(block)] = take_along_axis(dis, order, axis=1)
+    return nbrs, nbrdis
+
+
+def _partial_near(nbrs, start, stop, step):
+    """ Contributions of the nearest positions of the rows start..stop """
+    info = zeros(len(nbrs))
+    for begin in range(start, stop, step):
+        end = min(begin+step, stop)
+        ids, weights = reciprocal_weights(nbrs[begin:end], begin)
+        get_backend().scatter_add(info, ids.ravel(), weights.ravel())
+    return info
+
+
+def truncated_infovector(nbrs, blocksize=None, n_jobs=1):
+    """Information vector restricted to the nearest positions of every row
+
+    Only the first nnear positions of every row contribute, with the
+    weights of infovector, plus the unit contribution of position i of
+    row i, which every object gets whatever nnear.
+
+    Parameters
+    ----------
+    nbrs : array, shape(row, nnear)
+        Ids of the nearest objects of every object, closest first,
+        as returned by nearest.
+
+    blocksize : int, optional, default: None
+        Number of rows processed at once, see infovector.
+
+    n_jobs : int, optional, default: 1
+        Number of threads, see infovector.
+
+    Returns
+    ------
+    info : array, shape(row,)
+        The truncated information vector. It is the exact one
+        when nnear is row.
+    """
+    row, nnear = nbrs.shape
+    step = blockrows(row, nnear, blocksize)
+    info = _threads(_partial_near,
+                    lambda start, stop: (nbrs, start, stop, step),
+                    row, step, n_jobs)
+    # position i of row i falls beyond the nearest positions
+    info[nnear:] += 1.0
+    return info
+
+
+def _partial_far(dmx, refids, nnear, step):
+    """Contributions of the far positions of the reference rows
+    to the other objects, and their squares
+    """
+    row = len(dmx)
+    far = zeros(row)
+    sqfar = zeros(row)
+    for begin in range(0, len(refids), step):
+        rowids = refids[begin:begin+step]
+        order = rank_rows(dmx.take(rowids, 0, row))
+        ids, weights = reciprocal_weights(order, rowids)
+        ids = ids[:, nnear:]
+        weights = weights[:, nnear:]
+        other = ids != rowids[:, None]
+        ids = ids[other]
+        weights = weights[other]
+        get_backend().scatter_add(far, ids, weights)
+        get_backend().scatter_add(sqfar, ids, weights*weights)
+    return far, sqfar
+
+
+def sampled_infovector(dmx, refids, nnear=128, blocksize=None, n_jobs=1):
+    """Estimate the information vector from a sample of rows
+
+    The contribution of a row is split at position nnear. The near
+    part, 1/2, 1/3, ... to the closest objects, carries most of the
+    information and most of the variance: it is computed exactly for
+    every row from the nearest objects. The far part of every object
+    is estimated from the reference rows, fully ranked, scaled to the
+    row-1 rows of the other objects.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row)
+        A square or condensed distance matrix, or a distance storage.
+
+    refids : array, shape(nref,)
+        Ids of the reference rows, without repetitions.
+
+    nnear : int, optional, default: 128
+        Number of nearest positions computed exactly, see nearest.
+
+    blocksize : int, optional, default: None
+        Number of rows ranked at once, see infovector.
+
+    n_jobs : int, optional, default: 1
+        Number of threads, see infovector.
+
+    Returns
+    ------
+    info : array, shape(row,)
+        The estimated information vector. It is the exact one when
+        the reference rows are all the rows and no objects are
+        duplicated.
+
+    infoerr : array, shape(row,)
+        Standard error of the estimate of every object, with the
+        finite population correction of sampling without replacement.
+    """
+    dmx = asdistance(dmx)
+    refids = asarray(refids, dtype=int64)
+    row = len(dmx)
+    nref = len(refids)
+    nnear = min(max(nnear, 1), row)
+    info = truncated_infovector(nearest(dmx, nnear, blocksize)[0],
+                                blocksize, n_jobs)
+    step = blockrows(nref, row, blocksize)
+    far, sqfar = _threads(_partial_far,
+                          lambda start, stop: (dmx, refids[start:stop], nnear,
+                                               step),
+                          nref, step, n_jobs)
+    # number of reference rows of the other objects
+    count = full(row, float(nref))
+    count[refids] -= 1
+    count = maximum(count, 1)
+    mean = far / count
+    var = maximum(sqfar / count - mean*mean, 0)
+    var *= count / maximum(count - 1, 1)
+    info += (row - 1) * mean
+    fpc = maximum(1 - count/max(row - 1, 1), 0)
+    return info, (row - 1) * sqrt(var / count * fpc)
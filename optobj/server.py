@@ -0,0 +1,603 @@
+"""
+Local selection server keeping the distance matrices resident across jobs
+
+Start it from the command line, for example:
+
+    python -m optobj.server --socket /tmp/optobj.sock --maxmemory 4096
+    python -m optobj.server --port 8765
+
+and talk to it with Client. The protocol is one JSON object per line
+in each direction; the put request is followed by the raw bytes of
+the matrix.
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+
+from numpy import asarray, dtype as npdtype, load as npload, ndarray, prod
+
+from optobj.session import Session
+
+# Bytes copied at once into the shared memory by put and load
+CHUNK = 1 << 22
+
+# Errors of a request sent back to the client, the connection stays open
+REQUEST_ERRORS = (ArithmeticError, AttributeError, KeyError, IndexError,
+                  MemoryError, OSError, RuntimeError, TypeError, ValueError)
+
+# Sessions of the worker process by shared memory name
+_SESSIONS = OrderedDict()
+_MAXSESSIONS = 4
+
+
+def _init(maxsessions):
+    """ Configure the session cache of the worker process """
+    global _MAXSESSIONS
+    _MAXSESSIONS = maxsessions
+    # forked workers inherit the random state of the server, the DISC
+    # requests without a seed must not repeat the same first pick
+    random.seed()
+
+
+def _session(spec, blocksize, cachesize):
+    """ Session on a shared matrix, attached on the first use """
+    shmname, shape, dtype = spec
+    if shmname in _SESSIONS:
+        _SESSIONS.move_to_end(shmname)
+        return _SESSIONS[shmname][1]
+    shm = SharedMemory(shmname)
+    dmx = ndarray(shape, dtype=dtype, buffer=shm.buf)
+    session = Session(dmx, blocksize=blocksize, cachesize=cachesize)
+    _SESSIONS[shmname] = (shm, session)
+    return session
+
+
+def _detach(shmname):
+    """ Drop the session of a shared matrix and unmap it """
+    shm, session = _SESSIONS.pop(shmname)
+    del session
+    try:
+        shm.close()
+    except BufferError:
+        # a view is still referenced, the mapping goes with it
+        pass
+
+
+def _select(spec, live, method, nobjects, seed, blocksize, cachesize):
+    """ Run a selection in the worker process """
+    for shmname in [name for name in _SESSIONS if name not in live]:
+        _detach(shmname)
+    session = _session(spec, blocksize, cachesize)
+    while len(_SESSIONS) > max(_MAXSESSIONS, 1):
+        _detach(next(iter(_SESSIONS)))
+    ids = session.select(method, nobjects, seed)
+    return [int(i) for i in ids]
+
+
+class Dataset(object):
+    """A distance matrix resident in shared memory
+
+    Attributes
+    ----------
+    name : string
+        Name given by the client.
+
+    shm : SharedMemory
+        The block holding the matrix.
+
+    shape, dtype :
+        Layout of the matrix in the block.
+
+    busy : int
+        Selections running on the dataset.
+
+    selects : int
+        Selections served.
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(int(i) for i in shape)
+        self.dtype = npdtype(dtype)
+        self.nbytes = int(prod(self.shape)) * self.dtype.itemsize
+        self.shm = SharedMemory(create=True, size=max(self.nbytes, 1))
+        self.array = ndarray(self.shape, dtype=self.dtype,
+                             buffer=self.shm.buf)
+        self.ready = False
+        self.dropped = False
+        self.busy = 0
+        self.selects = 0
+
+    @property
+    def spec(self):
+        """ What a worker needs to attach the matrix """
+        return (self.shm.name, self.shape, self.dtype.str)
+
+    def info(self):
+        """ Description sent to the clients """
+        return {"name": self.name, "shape": list(self.shape),
+                "dtype": self.dtype.str, "nbytes": self.nbytes,
+                "selects": self.selects, "busy": self.busy}
+
+    def release(self):
+        """ Free the shared memory """
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SelectionServer(object):
+    """Serve MDC, KS and DISC selections of resident datasets
+
+    Every dataset is loaded once into shared memory and the worker
+    processes attach to it, so a job neither copies nor pickles the
+    matrix. Every worker keeps an optobj.session.Session per dataset,
+    so the MDC information vector is built once per worker and the
+    longer selections continue the shorter ones. The jobs of all the
+    clients run concurrently on the worker pool.
+
+    Parameters
+    ----------
+    path : string, optional, default: None
+        Unix socket to listen on. None means a TCP socket on host
+        and port.
+
+    host : string, optional, default: 127.0.0.1
+        Address of the TCP socket.
+
+    port : int, optional, default: 0
+        Port of the TCP socket, 0 means a free port.
+
+    maxmemory : int, optional, default: 1 GB
+        Memory cap in bytes of the datasets. Loading a dataset over the
+        cap evicts the least recently used idle ones.
+
+    n_jobs : int, optional, default: -1
+        Number of worker processes, -1 means one per CPU.
+
+    maxsessions : int, optional, default: 4
+        Datasets kept attached by every worker.
+
+    blocksize : int, optional, default: None
+        Block size of the selectors, see MDC and DISC.
+
+    cachesize : int, optional, default: 0
+        Memory cap in bytes of the MDC rank cache of every session.
+
+    Attributes
+    ----------
+    datasets_ : OrderedDict
+        Resident datasets by name, least recently used first.
+
+    memory_ : int
+        Bytes of the resident datasets.
+
+    requests_ : int
+        Requests served.
+
+    evictions_ : int
+        Datasets evicted to respect maxmemory.
+
+    Notes
+    -----
+    See examples/selection_server_example.py for an example.
+
+    An evicted or dropped dataset is unmapped by the workers on their
+    next job, and a running selection keeps its dataset until it ends.
+    """
+
+    def __init__(self, path=None, host="127.0.0.1", port=0,
+                 maxmemory=1 << 30, n_jobs=-1, maxsessions=4,
+                 blocksize=None, cachesize=0):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.maxmemory = maxmemory
+        self.n_jobs = n_jobs
+        self.maxsessions = maxsessions
+        self.blocksize = blocksize
+        self.cachesize = cachesize
+        self.datasets_ = OrderedDict()
+        self.memory_ = 0
+        self.requests_ = 0
+        self.evictions_ = 0
+        self._server = None
+        self._pool = None
+        self._stop = None
+        self._connections = {}
+
+    @property
+    def address(self):
+        """ Socket path or (host, port) the server listens on """
+        return self.path if self.path is not None else (self.host,
+                                                        self.port)
+
+    async def start(self):
+        """ Open the socket and the worker pool """
+        self._stop = asyncio.Event()
+        n_jobs = self.n_jobs if self.n_jobs > 0 else (cpu_count() or 1)
+        self._pool = ProcessPoolExecutor(n_jobs, initializer=_init,
+                                         initargs=(self.maxsessions,))
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           path=self.path)
+        else:
+            self._server = await asyncio.start_server(self._handle,
+                                                      self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve(self):
+        """ Serve until a shutdown request """
+        if self._server is None:
+            await self.start()
+        try:
+            await self._stop.wait()
+            # the open connections read EOF and their handlers return,
+            # so none is left to be cancelled
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        finally:
+            self.close()
+
+    def close(self):
+        """ Stop listening and free the workers and the datasets """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        for dataset in self.datasets_.values():
+            dataset.release()
+        self.datasets_.clear()
+        self.memory_ = 0
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader, writer):
+        """ Serve the requests of a connection in order """
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    name = "_op_" + str(message.get("op"))
+                    if not hasattr(self, name):
+                        raise ValueError("Unknown operation %s" %
+                                         (message.get("op")))
+                    reply = await getattr(self, name)(message, reader)
+                except REQUEST_ERRORS as err:
+                    reply = {"error": "%s: %s" % (type(err).__name__, err)}
+                self.requests_ += 1
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # the server is shutting down with the connection open
+            writer.close()
+            raise
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    def _reserve(self, nbytes):
+        """ Evict idle datasets until nbytes fit under maxmemory """
+        if nbytes > self.maxmemory:
+            raise MemoryError("%d bytes exceed maxmemory" % (nbytes))
+        for name in list(self.datasets_):
+            if self.memory_ + nbytes <= self.maxmemory:
+                break
+            dataset = self.datasets_[name]
+            if dataset.ready and dataset.busy == 0:
+                self._remove(name)
+                self.evictions_ += 1
+        if self.memory_ + nbytes > self.maxmemory:
+            raise MemoryError("The resident datasets are in use")
+
+    def _create(self, name, shape, dtype):
+        """ Allocate a dataset, replacing one with the same name """
+        if name in self.datasets_:
+            self._remove(name)
+        self._reserve(int(prod(shape)) * npdtype(dtype).itemsize)
+        dataset = Dataset(name, shape, dtype)
+        self.datasets_[name] = dataset
+        self.memory_ += dataset.nbytes
+        return dataset
+
+    def _remove(self, name):
+        """ Forget a dataset, freed when its last selection ends """
+        dataset = self.datasets_.pop(name)
+        self.memory_ -= dataset.nbytes
+        dataset.dropped = True
+        if dataset.busy == 0:
+            dataset.release()
+
+    def _get(self, name):
+        """ A ready dataset, marked as the most recently used """
+        dataset = self.datasets_.get(name)
+        if dataset is None or not dataset.ready:
+            raise KeyError("Unknown dataset %s" % (name))
+        self.datasets_.move_to_end(name)
+        return dataset
+
+    async def _op_put(self, message, reader):
+        """ Receive a matrix sent after the request """
+        nbytes = int(message.get("nbytes", 0))
+        try:
+            dataset = self._create(message["name"], message["shape"],
+                                   message["dtype"])
+            if dataset.nbytes != nbytes:
+                self._remove(dataset.name)
+                raise ValueError("%d bytes announced for a %d bytes matrix"
+                                 % (nbytes, dataset.nbytes))
+        except REQUEST_ERRORS:
+            # the payload follows anyway, keep the stream in sync
+            await _discard(reader, nbytes)
+            raise
+        try:
+            buf = dataset.shm.buf
+            for start in range(0, dataset.nbytes, CHUNK):
+                stop = min(start + CHUNK, dataset.nbytes)
+                buf[start:stop] = await reader.readexactly(stop - start)
+        except BaseException:
+            self._remove(dataset.name)
+            raise
+        dataset.ready = True
+        return dataset.info()
+
+    async def _op_load(self, message, _reader):
+        """ Read a matrix from a .npy file on the server machine """
+        mx = npload(message["path"], mmap_mode="r")
+        dataset = self._create(message["name"], mx.shape, mx.dtype)
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _copy, mx, dataset.array)
+        except BaseException:
+            self._remove(dataset.name)
+            raise
+        dataset.ready = True
+        return dataset.info()
+
+    async def _op_select(self, message, _reader):
+        """ Run a selection on the worker pool """
+        dataset = self._get(message["dataset"])
+        live = set(item.shm.name for item in self.datasets_.values())
+        loop = asyncio.get_running_loop()
+        dataset.busy += 1
+        t = time.time()
+        try:
+            ids = await loop.run_in_executor(
+                self._pool, _select, dataset.spec, live,
+                message.get("method", "mdc"),
+                int(message.get("nobjects", 0)), message.get("seed"),
+                self.blocksize, self.cachesize)
+        finally:
+            dataset.busy -= 1
+            if dataset.dropped and dataset.busy == 0:
+                dataset.release()
+        dataset.selects += 1
+        return {"ids": ids, "seconds": time.time() - t}
+
+    async def _op_drop(self, message, _reader):
+        """ Remove a dataset """
+        if message["name"] not in self.datasets_:
+            raise KeyError("Unknown dataset %s" % (message["name"]))
+        self._remove(message["name"])
+        return {}
+
+    async def _op_datasets(self, _message, _reader):
+        """ The resident datasets, least recently used first """
+        return {"datasets": [dataset.info()
+                             for dataset in self.datasets_.values()
+                             if dataset.ready]}
+
+    async def _op_stats(self, _message, _reader):
+        """ Memory and request counters """
+        return {"memory": self.memory_, "maxmemory": self.maxmemory,
+                "datasets": len(self.datasets_),
+                "requests": self.requests_, "evictions": self.evictions_}
+
+    async def _op_shutdown(self, _message, _reader):
+        """ Stop the server after this reply """
+        self._stop.set()
+        return {}
+
+
+async def _discard(reader, nbytes):
+    """ Read and drop nbytes from the stream """
+    for start in range(0, nbytes, CHUNK):
+        await reader.readexactly(min(CHUNK, nbytes - start))
+
+
+def _copy(src, dst):
+    """ Copy a (memory mapped) matrix in chunks of rows """
+    step = max(1, CHUNK // max(src[:1].nbytes, 1))
+    for start in range(0, len(src), step):
+        dst[start:start+step] = src[start:start+step]
+
+
+class Client(object):
+    """Blocking client of a SelectionServer
+
+    Parameters
+    ----------
+    address : string or (host, port)
+        Unix socket path or TCP address of the server.
+
+    wait : float, optional, default: 0
+        Seconds to keep retrying the connection, e.g. while the server
+        is starting.
+
+    Notes
+    -----
+    A client holds one connection and its requests are served in
+    order. Use one client per thread to run selections concurrently.
+    Errors of the server are raised as RuntimeError.
+    """
+
+    def __init__(self, address, wait=0.0):
+        deadline = time.time() + wait
+        while True:
+            try:
+                self._sock = self._connect(address)
+                break
+            except (FileNotFoundError, ConnectionError):
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.05)
+        self._file = self._sock.makefile("rwb")
+
+    @staticmethod
+    def _connect(address):
+        """ Open the socket of address """
+        if isinstance(address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+        return socket.create_connection(tuple(address))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Close the connection """
+        self._file.close()
+        self._sock.close()
+
+    def _request(self, message, payload=None):
+        """ Send a request and return the reply """
+        self._file.write(json.dumps(message).encode() + b"\n")
+        if payload is not None:
+            self._file.write(payload)
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def put(self, name, dmx):
+        """Send a distance matrix to the server
+
+        Parameters
+        ----------
+        name : string
+            Name of the dataset, an existing one is replaced.
+
+        dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+            A square or condensed distance matrix.
+
+        Returns
+        ------
+        info : dict
+            name, shape, dtype and nbytes of the dataset.
+        """
+        dmx = asarray(dmx, order="C")
+        return self._request({"op": "put", "name": name,
+                              "shape": list(dmx.shape),
+                              "dtype": dmx.dtype.str,
+                              "nbytes": dmx.nbytes},
+                             memoryview(dmx).cast("B"))
+
+    def load(self, name, path):
+        """ Load a distance matrix saved with numpy.save on the server """
+        return self._request({"op": "load", "name": name,
+                              "path": os.path.abspath(path)})
+
+    def select(self, dataset, method="mdc", nobjects=0, seed=None):
+        """Run a selection on a resident dataset
+
+        Parameters
+        ----------
+        dataset : string
+            Name of the dataset.
+
+        method : string, optional, default: mdc
+            mdc, ks or one of the DISC methods max, min, med, sum.
+
+        nobjects : int, optional, default: 0
+            Number of objects to select, see Session.select.
+
+        seed : int, optional, default: None
+            Seed of the DISC first pick.
+
+        Returns
+        ------
+        ids : list
+            The selected ids.
+        """
+        return self._request({"op": "select", "dataset": dataset,
+                              "method": method, "nobjects": nobjects,
+                              "seed": seed})["ids"]
+
+    def drop(self, name):
+        """ Remove a dataset from the server """
+        self._request({"op": "drop", "name": name})
+
+    def datasets(self):
+        """ Description of the resident datasets """
+        return self._request({"op": "datasets"})["datasets"]
+
+    def stats(self):
+        """ Memory and request counters of the server """
+        return self._request({"op": "stats"})
+
+    def shutdown(self):
+        """ Stop the server """
+        self._request({"op": "shutdown"})
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--socket", help="unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--maxmemory", type=float, default=1024,
+                        help="memory cap of the datasets in MB")
+    parser.add_argument("-j", "--n-jobs", type=int, default=-1)
+    parser.add_argument("--maxsessions", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    server = SelectionServer(args.socket, args.host, args.port,
+                             int(args.maxmemory * 1024**2), args.n_jobs,
+                             args.maxsessions)
+
+    async def run():
+        await server.start()
+        print("listening on %s" % (server.address,), flush=True)
+        await server.serve()
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
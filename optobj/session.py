@@ -0,0 +1,196 @@
+"""
+Selection session reusing the precomputed state across many requests
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from collections import OrderedDict
+
+from numpy import array, int64
+
+from optobj.disc import DISC
+from optobj.distance import asdistance
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+
+class Session(object):
+    """Serve many selections of different size, seed and method
+    from the same dataset
+
+    The distance storage and the MDC information vector are built once.
+    MDC, KS and a seeded DISC are deterministic and a selection of k
+    objects is the prefix of any longer one, so every request continues
+    the longest selection computed so far and smaller k are answered by
+    slicing it. The running selectors are kept in a LRU cache of
+    maxstates entries.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+        A square distance matrix, a condensed distance matrix
+        or a distance storage of optobj.distance.
+
+    x : array, shape(row,col), optional, default: None
+        The feature matrix. When given KS runs on the euclidean
+        distances of x, otherwise on dmx.
+
+    blocksize : int, optional, default: None
+        Block size of the selectors, see MDC and DISC.
+
+    cachesize : int, optional, default: 0
+        Memory cap in bytes of the MDC rank cache, shared by all
+        the MDC states of the session.
+
+    n_jobs : int, optional, default: 1
+        Number of threads of the information vector build and number
+        of worker processes of KS and DISC.
+
+    maxstates : int, optional, default: 8
+        Number of running selectors kept. The least recently used is
+        dropped and a later request for it starts again from the
+        information vector or from the first pick.
+
+    Attributes
+    ----------
+    info_ : array, shape (row_,)
+        The MDC information vector before any selection, built on the
+        first MDC request.
+
+    states_ : OrderedDict
+        Running selectors by (method, seed), least recently used first.
+
+    hits_ : int
+        Requests answered from a running selector.
+
+    misses_ : int
+        Requests that started a new selector.
+
+    Notes
+    -----
+    See examples/session_example.py for an example.
+    """
+
+    def __init__(self, dmx, x=None, blocksize=None, cachesize=0, n_jobs=1,
+                 maxstates=8):
+        self.dmx_ = asdistance(dmx)
+        self.x = x
+        self.blocksize = blocksize
+        self.cachesize = cachesize
+        self.n_jobs = n_jobs
+        self.maxstates = maxstates
+        self.info_ = None
+        self.rankcache_ = None
+        self.states_ = OrderedDict()
+        self.hits_ = 0
+        self.misses_ = 0
+        self._mdcstop = None
+
+    def select(self, method, nobjects=0, seed=None):
+        """Run a selection
+
+        Parameters
+        ----------
+        method : string
+            mdc, ks or one of the DISC methods max, min, med, sum.
+
+        nobjects : int, optional, default: 0
+            Number of objects to select, 0 has the meaning of the
+            selector nobjects argument.
+
+        seed : int, optional, default: None
+            Seed of the DISC first pick. None means the global random
+            generator and the selection is not cached.
+
+        Returns
+        ------
+        ids : list
+            The selected ids.
+        """
+        method = method.lower().strip()
+        if method == "mdc":
+            return self.mdc(nobjects)
+        if method == "ks":
+            return self.ks(nobjects)
+        return self.disc(method, nobjects, seed)
+
+    def mdc(self, nobjects=0):
+        """ Most Descriptive Compound selection, see MDC """
+        sel = self._state(("mdc", None), self._newmdc)
+        if nobjects <= 0:
+            # a selector rebuilt after an eviction starts from no pick
+            while (self._mdcstop is None or
+                   len(sel.mdcids) < self._mdcstop):
+                self._mdcstep(sel)
+            return sel.mdcids[:self._mdcstop]
+        nobjects = min(nobjects, len(self.dmx_))
+        while len(sel.mdcids) < nobjects:
+            self._mdcstep(sel)
+        return sel.mdcids[:nobjects]
+
+    def ks(self, nobjects=0):
+        """ Kennard-Stones selection, see KS """
+        sel = self._state(("ks", None), self._newks)
+        sel.nobjects = nobjects
+        row = len(self.dmx_)
+        return sel.select()[:nobjects if 0 < nobjects < row else row]
+
+    def disc(self, method, nobjects=0, seed=None):
+        """ Dissimilarity selection, see DISC """
+        method = method.lower().strip()
+        nobjects = min(max(nobjects, 1), len(self.dmx_))
+        if seed is None:
+            return DISC(self.dmx_, method, nobjects, self.blocksize,
+                        self.n_jobs).select()
+        sel = self._state((method, seed),
+                          lambda: DISC(self.dmx_, method, 0, self.blocksize,
+                                       self.n_jobs, random_state=seed))
+        sel.nobjects = nobjects
+        return sel.select()[:nobjects]
+
+    def _state(self, key, factory):
+        """ Running selector of key, created by factory when missing """
+        sel = self.states_.get(key)
+        if sel is not None:
+            self.states_.move_to_end(key)
+            self.hits_ += 1
+            return sel
+        self.misses_ += 1
+        sel = factory()
+        self.states_[key] = sel
+        while len(self.states_) > max(self.maxstates, 1):
+            self.states_.popitem(last=False)
+        return sel
+
+    def _newmdc(self):
+        """ MDC selector starting from the session information vector """
+        if self.info_ is None:
+            sel = MDC(self.dmx_, 0, self.blocksize, self.cachesize,
+                      self.n_jobs)
+            self.info_ = sel.info_.copy()
+            self.rankcache_ = sel.rankcache_
+            return sel
+        params = {"nobjects": 0,
+                  "blocksize": self.blocksize,
+                  "cachesize": self.cachesize,
+                  "n_jobs": self.n_jobs}
+        sel = MDC._fromstate(self.dmx_, params,
+                             {"ids": array([], dtype=int64),
+                              "info": self.info_.copy()})
+        sel.rankcache_ = self.rankcache_
+        return sel
+
+    def _newks(self):
+        """ KS selector on the features or on the distances """
+        if self.x is not None:
+            return KS(self.x, 0, "euclidean", self.blocksize, self.n_jobs)
+        return KS(self.dmx_, 0, "precomputed", self.blocksize, self.n_jobs)
+
+    def _mdcstep(self, sel):
+        """ Select the next mdc and record where the autostop falls """
+        sel.getnext()
+        if self._mdcstop is None:
+            # the MDC.select autostop criterion
+            if (len(sel.mdcids) == len(self.dmx_) or
+                    (sel.info_ < 1).sum() > len(sel.mdcids)):
+                self._mdcstop = len(sel.mdcids)
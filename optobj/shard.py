@@ -0,0 +1,201 @@
+"""
+Sharded multi-process MaxMin selection
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from multiprocessing import Pipe, Process
+from os import cpu_count
+
+from numpy import (asarray, concatenate, dot, einsum, float64, inf, maximum,
+                   minimum, where, zeros)
+
+from optobj.profiling import PhaseTimer, notify
+
+
+def _best(score, start, last):
+    """ Local (max, id) of a score vector """
+    if last:
+        i = len(score) - 1 - score[::-1].argmax()
+    else:
+        i = score.argmax()
+    return score[i], start+i
+
+
+def _worker(conn, data, start, features, aggregate, last):
+    """Keep the aggregate distances of a slice of the objects
+
+    Answer the ("add", (objid, point)) messages with the local best
+    unselected object, ("scores", None) with the local aggregate vector
+    and stop on ("close", None).
+    """
+    sqnorms = einsum("ij,ij->i", data, data) if features else None
+    selected = zeros(len(data), dtype=bool)
+    dis = None
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == "add":
+            objid, point = arg
+            if features:
+                row = sqnorms - 2*dot(data, point)
+                row += einsum("ij,ij->i", point[None, :], point[None, :])[0]
+                maximum(row, 0, out=row)
+            else:
+                row = asarray(data[:, objid], dtype=float64)
+            if dis is None:
+                dis = row.astype(float64)
+            elif aggregate == "min":
+                minimum(dis, row, out=dis)
+            elif aggregate == "max":
+                maximum(dis, row, out=dis)
+            else:
+                dis += row
+            if start <= objid < start+len(data):
+                selected[objid-start] = True
+            conn.send(_best(where(selected, -inf, dis), start, last))
+        elif cmd == "scores":
+            conn.send(dis)
+        else:
+            break
+    conn.close()
+
+
+class ShardedMaxMin(object):
+    """Spread a MaxMin style selection over worker processes
+
+    Every worker holds a contiguous slice of the objects, either rows of
+    the feature matrix or rows of the distance matrix, together with its
+    slice of the aggregate distance vector. At every step the new object
+    is broadcast and the workers return their local (max, id), so the
+    memory of each process is O(row/n_jobs).
+
+    Parameters
+    ----------
+    x : array or distance storage, shape(row,col) or shape(row,row)
+        The feature matrix, or the distance matrix when features
+        is False.
+
+    features : bool, optional, default: True
+        x is a feature matrix and the workers compute squared euclidean
+        distances, otherwise x is read as a distance matrix.
+
+    aggregate : string, optional, default: min
+        Distance of an object from the selected ones: min, max or sum.
+
+    last : bool, optional, default: False
+        Break ties of the maximum on the highest id instead of
+        the lowest one.
+
+    n_jobs : int, optional, default: -1
+        Number of worker processes. -1 means all the CPUs.
+    """
+
+    def __init__(self, x, features=True, aggregate="min", last=False,
+                 n_jobs=-1):
+        self.x = x
+        self.features = features
+        self.last = last
+        row = len(x)
+        if n_jobs < 0:
+            n_jobs = cpu_count() or 1
+        n_jobs = max(1, min(n_jobs, row))
+        bounds = [row*i // n_jobs for i in range(n_jobs+1)]
+        self.conns = []
+        self.procs = []
+        for i in range(n_jobs):
+            if features:
+                data = asarray(x[bounds[i]:bounds[i+1]])
+            else:
+                data = asarray(x.rows(bounds[i], bounds[i+1]))
+            conn, child = Pipe()
+            proc = Process(target=_worker,
+                           args=(child, data, bounds[i], features, aggregate,
+                                 last))
+            proc.daemon = True
+            proc.start()
+            child.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+
+    def add(self, objid):
+        """ Add objid to the selection and return the next object id """
+        point = asarray(self.x[objid]) if self.features else None
+        for conn in self.conns:
+            conn.send(("add", (objid, point)))
+        replies = [conn.recv() for conn in self.conns]
+        best = replies[0]
+        for value, i in replies[1:]:
+            if value > best[0] or (self.last and value == best[0]):
+                best = (value, i)
+        return int(best[1])
+
+    def scores(self):
+        """ Gather the aggregate distance vector """
+        for conn in self.conns:
+            conn.send(("scores", None))
+        return [conn.recv() for conn in self.conns]
+
+    def close(self):
+        """ Stop the worker processes """
+        for conn in self.conns:
+            conn.send(("close", None))
+            conn.close()
+        for proc in self.procs:
+            proc.join()
+        self.conns = []
+        self.procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_sharded(sel, ids, x, features, aggregate, last, scores):
+    """Run the selection of sel on worker processes
+
+    Parameters
+    ----------
+    sel : object
+        The selector, with its selected_ mask, n_jobs and observer.
+
+    ids : list
+        Ids selected by sel, at least one, extended in place.
+
+    x, features, aggregate, last
+        See ShardedMaxMin.
+
+    scores : string
+        Attribute of sel set to the aggregate distances gathered from
+        the workers when the generator stops.
+
+    Returns
+    ------
+    objid : generator
+        Yield every id selected.
+    """
+    if len(ids) == len(x):
+        return
+    with ShardedMaxMin(x, features, aggregate, last, sel.n_jobs) as shards:
+        sel._shards = shards
+        try:
+            for objid in ids[:-1]:
+                shards.add(objid)
+            nextid = shards.add(ids[-1])
+            while len(ids) < len(x):
+                timer = None
+                if sel.observer is not None:
+                    timer = PhaseTimer()
+                ids.append(nextid)
+                sel.selected_[nextid] = True
+                # the workers update their scores and return the argmax
+                nextid = shards.add(nextid)
+                if timer is not None:
+                    timer.lap("update")
+                    notify(sel, timer, len(ids), ids[-1], len(x))
+                yield ids[-1]
+        finally:
+            # the aggregate distances live in the workers
+            setattr(sel, scores, concatenate(shards.scores()))
+            sel._shards = None
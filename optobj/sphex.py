@@ -0,0 +1,151 @@
+"""
+Sphere exclusion object selection
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from numpy import arange, asarray, zeros
+
+from optobj.profiling import PhaseTimer, notify
+
+
+class SphereExclusion(object):
+    """Perform Sphere Exclusion diverse object selection
+
+    The candidates are visited in order: the first one not yet excluded
+    is selected and every object within radius from it is excluded.
+    The neighbourhood is found with a k-d tree radius query, so a step
+    only reads the distances around the selected object instead of
+    scanning all the objects as DISC and KS do. Selected objects are
+    more than radius apart and every object is within radius from a
+    selected one.
+
+    Parameters
+    ----------
+    x : array, shape(row,col)
+        The feature matrix.
+
+    radius : float
+        Exclusion radius.
+
+    nobjects : int, optional, default: 0
+        Number of object to select. 0 means select until every
+        object is excluded.
+
+    order : array, shape(row,), optional, default: None
+        Visiting order of the candidates, e.g. ids sorted by a property
+        or a random permutation. None means the row order, as in the
+        leader algorithm.
+
+    p : float, optional, default: 2
+        Minkowski p-norm of the distances. 2 is euclidean,
+        1 is cityblock and inf is chebyshev.
+
+    leafsize : int, optional, default: 16
+        Leaf size of the k-d tree.
+
+    observer : callable, optional, default: None
+        Called with an optobj.profiling.StepEvent after every selected
+        object. lookups is the number of objects found by the radius
+        query.
+
+    Attributes
+    ----------
+    tree_ : scipy.spatial.cKDTree
+        The k-d tree of x.
+
+    excluded_ : array, shape (row_,)
+        Boolean mask of the selected and excluded objects.
+
+    Returns
+    ------
+    sphids: list
+        Return the list of id selected from the algorithm.
+
+
+    Notes
+    -----
+    See examples/benchmark_sphex_example.py for an example.
+
+    References
+    ----------
+    Brian D. Hudson, Richard M. Hyde, Elizabeth Rahr and John Wood,
+    Parameter Based Methods for Compound Selection from Chemical Databases,
+    Quant. Struct. Act. Relat. j. 185-289 1996
+
+    Andrea Gobbi and Man-Ling Lee
+    DISE: Directed Sphere Exclusion
+    J. Chem. Inf. Comput. Sci. Vol. 43, pag 317-323, 2003
+    """
+
+    def __init__(self, x, radius, nobjects=0, order=None, p=2, leafsize=16,
+                 observer=None):
+        from scipy.spatial import cKDTree
+        self.x_ = asarray(x)
+        self.radius = radius
+        self.nobjects = nobjects
+        self.p = p
+        self.observer = observer
+        self.tree_ = cKDTree(self.x_, leafsize)
+        if order is None:
+            self.order_ = arange(len(self.x_))
+        else:
+            self.order_ = asarray(order)
+        self.excluded_ = zeros(len(self.x_), dtype=bool)
+        self.sphids = []
+        self._pos = 0
+
+    def sphlist(self):
+        """ Return the list of sphere exclusion selected objects """
+        return self.sphids
+
+    def iter_select(self):
+        """Yield the selected objects one at a time
+
+        The neighbourhood of every object is excluded before its id is
+        yielded, so the iteration can be stopped at any point and
+        resumed with another iter_select or select call.
+        """
+        while True:
+            objid = self._appendnext()
+            if objid is None:
+                return
+            yield objid
+
+    def select(self):
+        """ Run the Sphere Exclusion selection """
+        selection = self.iter_select()
+        for _ in selection:
+            if 0 < self.nobjects <= len(self.sphids):
+                break
+        selection.close()
+        return self.sphids
+
+    def _appendnext(self):
+        """Select the next candidate not excluded and exclude its sphere
+
+        Returns None when every object is excluded.
+        """
+        timer = PhaseTimer() if self.observer is not None else None
+        order = self.order_
+        excluded = self.excluded_
+        pos = self._pos
+        while pos < len(order) and excluded[order[pos]]:
+            pos += 1
+        self._pos = pos
+        if pos == len(order):
+            return None
+        objid = int(order[pos])
+        if timer is not None:
+            timer.lap("argmax")
+        neighbours = self.tree_.query_ball_point(self.x_[objid], self.radius,
+                                                 p=self.p,
+                                                 return_sorted=False)
+        excluded[neighbours] = True
+        excluded[objid] = True
+        if timer is not None:
+            timer.lap("update")
+        self.sphids.append(objid)
+        if timer is not None:
+            notify(self, timer, len(self.sphids), objid, len(neighbours))
+        return objid
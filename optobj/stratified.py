@@ -0,0 +1,280 @@
+"""
+Stratified object selection with per-stratum quotas
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from concurrent.futures import ProcessPoolExecutor
+from numbers import Integral
+from os import cpu_count
+
+from numpy import (arange, array, asarray, fill_diagonal, flatnonzero,
+                   float64, inf, int64, unique, unravel_index)
+
+from optobj.disc import DISC, _rng
+from optobj.distance import (SquareDistance, SubsetDistance, asdistance,
+                             needs_copy, shared_pool, worker_distance)
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+def allocate(sizes, quotas):
+    """Number of objects to select in every stratum
+
+    Parameters
+    ----------
+    sizes : dict
+        Number of objects of every stratum by label.
+
+    quotas : int, float or dict
+        An int is a total split in proportion to the stratum sizes
+        with the largest remainder method, a float is the fraction
+        of every stratum to select and a dict gives the number of
+        objects of every label, missing labels select none.
+
+    Returns
+    ------
+    counts : dict
+        Number of objects to select by label, at most the stratum size.
+    """
+    if isinstance(quotas, dict):
+        return dict((label, max(0, min(int(quotas.get(label, 0)), size)))
+                    for label, size in sizes.items())
+    total = sum(sizes.values())
+    if isinstance(quotas, Integral):
+        parts = [min(quotas, total) * size / float(total)
+                 for size in sizes.values()]
+    else:
+        parts = [float(quotas) * size for size in sizes.values()]
+        quotas = int(round(sum(parts)))
+    counts = [int(item) for item in parts]
+    # the largest remainders get the objects left
+    order = sorted(range(len(parts)), key=lambda i: counts[i] - parts[i])
+    left = min(quotas, total) - sum(counts)
+    for i in order[:max(left, 0)]:
+        counts[i] += 1
+    return dict((label, min(count, size))
+                for (label, size), count in zip(sizes.items(), counts))
+
+
+def _run(dmx, ids, method, nobjects, seed, blocksize):
+    """ Select nobjects of the stratum ids, ids of dmx in selection order """
+    if len(ids) < 2:
+        return [int(i) for i in ids]
+    sub = SubsetDistance(dmx, ids)
+    if method == "mdc":
+        sel = MDC(sub, nobjects, blocksize)
+    elif method == "ks":
+        sel = KS(sub, nobjects, "precomputed", blocksize)
+    else:
+        sel = DISC(sub, method, nobjects, blocksize, random_state=seed)
+    return [int(ids[i]) for i in sel.select()[:nobjects]]
+
+
+def _run_worker(ids, method, nobjects, seed, blocksize):
+    """ Stratum selection on the storage of the worker process """
+    return _run(worker_distance(), ids, method, nobjects, seed, blocksize)
+
+
+def _run_stratum(sub, ids, method, nobjects, seed, blocksize):
+    """ Stratum selection on the square submatrix sub of the stratum ids """
+    pos = _run(SquareDistance(sub), arange(len(ids)), method, nobjects, seed,
+               blocksize)
+    return [int(ids[i]) for i in pos]
+
+
+def _refine(dmx, ids, groups, strata, maxiter):
+    """Exchange objects to raise the smallest pairwise distance
+
+    The closest pair of the selection is looked up at every iteration
+    and one of the two objects is replaced by the unselected object of
+    its own stratum farthest from the rest of the selection, when that
+    one is farther than the current object. The quotas are kept.
+    """
+    ids = array(ids, dtype=int64)
+    if len(ids) < 2:
+        return ids.tolist(), 0
+    pairs = asarray(dmx.pairs(ids, ids), dtype=float64)
+    fill_diagonal(pairs, inf)
+    nswaps = 0
+    for _ in range(maxiter):
+        closest = unravel_index(pairs.argmin(), pairs.shape)
+        swapped = False
+        for pos in closest:
+            members = strata[groups[ids[pos]]]
+            members = members[~(members[:, None] == ids[None, :]).any(1)]
+            if len(members) == 0:
+                continue
+            dis = asarray(dmx.pairs(members, ids), dtype=float64)
+            dis[:, pos] = inf
+            near = dis.min(axis=1)
+            best = near.argmax()
+            if near[best] <= pairs[pos].min():
+                continue
+            ids[pos] = members[best]
+            pairs[pos] = dis[best]
+            pairs[:, pos] = dis[best]
+            pairs[pos, pos] = inf
+            nswaps += 1
+            swapped = True
+            break
+        if not swapped:
+            break
+    return ids.tolist(), nswaps
+
+
+class StratifiedSelection(object):
+    """Perform an object selection inside every stratum of the objects
+
+    The objects are split by label, every stratum runs its own MDC,
+    KS or DISC on its distance submatrix and the selections are merged.
+    A stratum of m objects reads O(m*m) distances, instead of the row*row
+    of a selection on all the objects, and the strata run in parallel
+    on worker processes. An array in memory is not copied: every worker
+    gets the m*m submatrix of its stratum only. Memory mapped files are
+    reopened by the workers and the other storages, e.g. a
+    FeatureDistance, are sent whole and read by stratum.
+
+    Parameters
+    ----------
+    dmx : array, shape(row,row) or shape(row*(row-1)/2,)
+        A square distance matrix, a condensed distance matrix
+        or a distance storage of optobj.distance. For features use
+        a FeatureDistance, whose strata compute their distances only.
+
+    labels : array, shape(row,)
+        Stratum of every object, e.g. class, scaffold or vendor.
+
+    quotas : int, float or dict
+        Objects to select, see allocate: a total split in proportion
+        to the stratum sizes, a fraction of every stratum or the number
+        of objects of every label.
+
+    method : string, optional, default: mdc
+        mdc, ks or one of the DISC methods max, min, med, sum.
+
+    refine : int, optional, default: 0
+        Iterations of the global diversity pass, see Notes. 0 merges
+        the stratum selections as they are.
+
+    blocksize : int, optional, default: None
+        Block size of the selectors, see MDC and DISC.
+
+    n_jobs : int, optional, default: -1
+        Number of worker processes. -1 means all the CPUs and 1 runs
+        the strata in this process.
+
+    random_state : int or random.Random, optional, default: None
+        Generator of the DISC seeds of the strata.
+
+    Attributes
+    ----------
+    strata_ : dict
+        Ids of the objects of every label.
+
+    counts_ : dict
+        Number of objects selected from every label.
+
+    selections_ : dict
+        Ids selected in every stratum, in selection order also when the
+        quota takes the whole stratum. After the global diversity pass
+        they follow the merged selection instead.
+
+    nswaps_ : int
+        Exchanges made by the global diversity pass.
+
+    Returns
+    ------
+    strids: list
+        Return the list of id selected, the strata interleaved
+        in their selection order.
+
+
+    Notes
+    -----
+    See examples/stratified_mdc_example.py for an example.
+
+    The strata are selected independently, so two strata that overlap
+    may give close objects. The global diversity pass repeatedly finds
+    the closest pair of the merged selection and replaces one of the two
+    objects with the object of the same stratum farthest from the rest of
+    the selection. Every iteration reads O(m*k) distances, with m the
+    stratum size and k the number of selected objects, and the quotas
+    are kept.
+    """
+
+    def __init__(self, dmx, labels, quotas, method="mdc", refine=0,
+                 blocksize=None, n_jobs=-1, random_state=None):
+        self.dmx_ = asdistance(dmx)
+        self.labels = asarray(labels)
+        if len(self.labels) != len(self.dmx_):
+            raise ValueError("One label per object is needed")
+        self.quotas = quotas
+        self.method = method.lower().strip()
+        self.refine = refine
+        self.blocksize = blocksize
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        names, self._groups = unique(self.labels, return_inverse=True)
+        self.strata_ = dict((name.item(), flatnonzero(self._groups == i))
+                            for i, name in enumerate(names))
+        self.counts_ = allocate(dict((label, len(ids))
+                                     for label, ids in self.strata_.items()),
+                                quotas)
+        self.selections_ = {}
+        self.nswaps_ = 0
+        self.strids = []
+
+    def strlist(self):
+        """ Return the list of selected objects """
+        return self.strids
+
+    def select(self):
+        """ Run the stratum selections and merge them """
+        rng = _rng(self.random_state)
+        jobs = [(label, self.strata_[label], count, rng.randrange(2**31))
+                for label, count in self.counts_.items() if count > 0]
+        n_jobs = self.n_jobs if self.n_jobs > 0 else (cpu_count() or 1)
+        n_jobs = min(n_jobs, max(len(jobs), 1))
+        if n_jobs == 1:
+            results = [_run(self.dmx_, ids, self.method, count, seed,
+                            self.blocksize)
+                       for _, ids, count, seed in jobs]
+        else:
+            # the largest strata first
+            order = sorted(range(len(jobs)), key=lambda i: -len(jobs[i][1]))
+            if needs_copy(self.dmx_):
+                # every worker gets the submatrix of its stratum only
+                with ProcessPoolExecutor(n_jobs) as pool:
+                    futures = dict((i, pool.submit(_run_stratum,
+                                                   self.dmx_.pairs(jobs[i][1],
+                                                                   jobs[i][1]),
+                                                   jobs[i][1], self.method,
+                                                   jobs[i][2], jobs[i][3],
+                                                   self.blocksize))
+                                   for i in order)
+                    results = [futures[i].result() for i in range(len(jobs))]
+            else:
+                with shared_pool(self.dmx_, n_jobs) as pool:
+                    futures = dict((i, pool.submit(_run_worker, jobs[i][1],
+                                                   self.method, jobs[i][2],
+                                                   jobs[i][3],
+                                                   self.blocksize))
+                                   for i in order)
+                    results = [futures[i].result() for i in range(len(jobs))]
+        self.selections_ = dict((job[0], ids)
+                                for job, ids in zip(jobs, results))
+        # round robin over the strata keeps every prefix balanced
+        merged = []
+        for step in range(max([len(ids) for ids in results] + [0])):
+            merged.extend(ids[step] for ids in results if step < len(ids))
+        if self.refine > 0:
+            # the identity subset reads the pairs of any storage
+            dmx = SubsetDistance(self.dmx_, arange(len(self.dmx_)))
+            merged, self.nswaps_ = _refine(dmx, merged, self._groups,
+                                           list(self.strata_.values()),
+                                           self.refine)
+            for label in self.selections_:
+                self.selections_[label] = [i for i in merged
+                                           if self.labels[i] == label]
+        self.strids = merged
+        return self.strlist()
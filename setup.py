@@ -8,7 +8,9 @@ setup(name='optobj',
       url='https://github.com/gmrandazzo/scikit-optobj',
       packages=['optobj'],
       license='Modified BSD License',
+      python_requires='>=3.9',
       install_requires=['numpy',
                         'scipy',
                         'scikit-learn'],
+      extras_require={'numba': ['numba']},
       platforms='Any',)
@@ -0,0 +1,53 @@
+"""
+Tests of the checkpoint and resume of the selections
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+
+from optobj import checkpoint
+from optobj.disc import DISC
+from optobj.knn import KNNMDC, knn_graph
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+X = np.random.RandomState(0).rand(80, 2)
+DMX = pdist(X)
+
+SELECTORS = {
+    "mdc": (lambda: MDC(DMX, 10), DMX),
+    "ks": (lambda: KS(X, 10), X),
+    "disc": (lambda: DISC(DMX, "min", 10, random_state=3), DMX),
+    "knnmdc": (lambda: KNNMDC(knn_graph(X, 8), 10), None),
+}
+
+
+def _make(name):
+    make, data = SELECTORS[name]
+    sel = make()
+    return sel, (sel.graph_ if data is None else data)
+
+
+@pytest.mark.parametrize("name", sorted(SELECTORS))
+def test_resume_makes_the_remaining_picks(name, tmp_path):
+    expected = _make(name)[0].select()
+    sel, data = _make(name)
+    for _ in zip(range(4), sel.iter_select()):
+        pass
+    filename = str(tmp_path / "snap.npz")
+    checkpoint.save(sel, filename)
+    assert checkpoint.load(filename, data).select() == expected
+
+
+@pytest.mark.parametrize("name", sorted(SELECTORS))
+def test_resume_at_the_final_step(name, tmp_path):
+    sel, data = _make(name)
+    expected = list(sel.select())
+    assert len(expected) == 10
+    assert sel.select() == expected
+    filename = str(tmp_path / "snap.npz")
+    checkpoint.save(sel, filename)
+    assert checkpoint.load(filename, data).select() == expected
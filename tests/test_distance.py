@@ -0,0 +1,39 @@
+"""
+Tests of the distance storages
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist, squareform
+
+from optobj.disc import DISC
+from optobj.distance import CondensedDistance, SquareDistance
+from optobj.ks import KS
+from optobj.mdc import MDC
+
+
+@pytest.mark.parametrize("row", [1, 2, 7])
+def test_condensed_reads_match_square(row):
+    dmx = pdist(np.random.RandomState(row).rand(row, 3))
+    condensed = CondensedDistance(dmx)
+    square = SquareDistance(squareform(dmx))
+    ids = np.arange(row)[::-1]
+    assert len(condensed) == row
+    for i in range(row):
+        assert np.array_equal(condensed.row(i), square.row(i))
+    assert np.array_equal(condensed.rows(0, row), square.rows(0, row))
+    assert np.array_equal(condensed.take(ids, 0, row),
+                          square.take(ids, 0, row))
+    assert np.array_equal(condensed.pairs(ids, ids), square.pairs(ids, ids))
+
+
+def test_selections_of_one_object():
+    x = np.random.RandomState(0).rand(1, 2)
+    dmx = pdist(x)
+    assert MDC(dmx).select() == [0]
+    assert KS(dmx, 1, "precomputed").select() == [0]
+    assert KS(x, 1).select() == [0]
+    for method in ("min", "max", "med", "sum"):
+        assert DISC(dmx, method, 1).select() == [0]
@@ -0,0 +1,59 @@
+"""
+Tests of the selection server protocol
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+
+from optobj.mdc import MDC
+from optobj.server import Client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def address(tmp_path):
+    """ Unix socket of a server with room for 1 MB of datasets """
+    path = str(tmp_path / "optobj.sock")
+    server = subprocess.Popen([sys.executable, "-m", "optobj.server",
+                               "--socket", path, "--maxmemory", "1",
+                               "--n-jobs", "1"], cwd=ROOT)
+    try:
+        yield path
+        with Client(path) as client:
+            client.shutdown()
+        assert server.wait(10) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+
+def test_put_select_drop(address):
+    dmx = pdist(np.random.RandomState(0).rand(100, 2))
+    with Client(address, wait=10.0) as client:
+        info = client.put("a", dmx)
+        assert info["shape"] == [len(dmx)] and info["nbytes"] == dmx.nbytes
+        assert client.select("a", "mdc", 10) == MDC(dmx, 10).select()
+        assert client.select("a") == MDC(dmx).select()
+        assert [item["name"] for item in client.datasets()] == ["a"]
+        client.drop("a")
+        with pytest.raises(RuntimeError):
+            client.select("a")
+        assert client.datasets() == []
+
+
+def test_rejected_put_keeps_the_connection(address):
+    with Client(address, wait=10.0) as client:
+        with pytest.raises(RuntimeError, match="MemoryError"):
+            client.put("huge", np.zeros((400, 400)))
+        with pytest.raises(RuntimeError, match="Unknown operation"):
+            client._request({"op": "nothing"})
+        stats = client.stats()
+        assert stats["datasets"] == 0 and stats["memory"] == 0
@@ -0,0 +1,59 @@
+"""
+Tests of the selection session and of the server worker sessions
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from optobj import server
+from optobj.mdc import MDC
+from optobj.session import Session
+
+
+def _dmx(row=60):
+    return pdist(np.random.RandomState(row).rand(row, 2))
+
+
+def test_mdc_autostop_after_eviction():
+    dmx = _dmx()
+    expected = MDC(dmx).select()
+    session = Session(dmx, maxstates=1)
+    assert session.select("mdc") == expected
+    session.select("ks", 3)
+    assert ("mdc", None) not in session.states_
+    assert session.select("mdc") == expected
+    assert session.misses_ == 3
+
+
+def test_prefixes_after_eviction():
+    dmx = _dmx()
+    session = Session(dmx, maxstates=1)
+    first = session.select("mdc", 10)
+    session.select("min", 5, seed=1)
+    assert session.select("mdc", 4) == first[:4]
+    assert session.select("mdc", 10) == first
+
+
+def test_server_worker_session_after_eviction():
+    dmx = _dmx()
+    expected = MDC(dmx).select()
+    shm = SharedMemory(create=True, size=dmx.nbytes)
+    try:
+        np.ndarray(dmx.shape, dtype=dmx.dtype, buffer=shm.buf)[...] = dmx
+        spec = (shm.name, dmx.shape, dmx.dtype.str)
+        live = [shm.name]
+        args = (None, 0)
+        assert server._select(spec, live, "mdc", 0, None, *args) == expected
+        # more seeded DISC states than the session keeps evict the MDC one
+        for seed in range(10):
+            server._select(spec, live, "max", 3, seed, *args)
+        assert server._select(spec, live, "mdc", 0, None, *args) == expected
+    finally:
+        for shmname in list(server._SESSIONS):
+            server._detach(shmname)
+        shm.close()
+        shm.unlink()
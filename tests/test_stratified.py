@@ -0,0 +1,44 @@
+"""
+Tests of the stratified selection
+"""
+# Author: Giuseppe Marco Randazzo gmrandazzo@gmail.com
+# License: BSD 3 clause
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+
+from optobj.distance import memmap_distance, needs_copy, write_distance
+from optobj.stratified import StratifiedSelection
+
+X = np.random.RandomState(2).rand(300, 2)
+LABELS = np.random.RandomState(3).choice(list("abc"), 300)
+
+
+@pytest.mark.parametrize("method", ["mdc", "ks", "min"])
+def test_workers_match_one_process(method):
+    dmx = pdist(X)
+    assert needs_copy(dmx)
+    expected = StratifiedSelection(dmx, LABELS, 30, method, refine=5,
+                                   n_jobs=1, random_state=1).select()
+    sel = StratifiedSelection(dmx, LABELS, 30, method, refine=5, n_jobs=2,
+                              random_state=1)
+    assert sel.select() == expected
+
+
+def test_memory_mapped_matrix_is_shared(tmp_path):
+    filename = str(tmp_path / "dmx.bin")
+    write_distance(filename, X, "euclidean", dtype="float64",
+                   layout="condensed")
+    dmx = memmap_distance(filename, len(X), layout="condensed")
+    assert not needs_copy(dmx)
+    expected = StratifiedSelection(pdist(X), LABELS, 30, n_jobs=1).select()
+    assert StratifiedSelection(dmx, LABELS, 30, n_jobs=2).select() == expected
+
+
+def test_whole_stratum_in_selection_order():
+    labels = np.array(["a"]*290 + ["b"]*10)
+    sel = StratifiedSelection(pdist(X), labels, {"a": 5, "b": 10}, n_jobs=1)
+    sel.select()
+    assert sorted(sel.selections_["b"]) == list(range(290, 300))
+    assert sel.selections_["b"] != sorted(sel.selections_["b"])